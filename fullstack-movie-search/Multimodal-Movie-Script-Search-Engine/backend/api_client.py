@@ -1,16 +1,101 @@
 """
 External API client for fetching real movie data from TMDB and OMDB
 """
+import math
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from rate_limiter import TokenBucket
+from http_cache import http_cache as default_http_cache
+from api_replay import apply_mode
+from catalog_crawl import CatalogListing, CrawlCheckpoint, item_key, popular_movies, take, trending_tv_shows
 import config
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+# TMDB list endpoints return this many results per page, and no more than this many pages
+TMDB_PAGE_SIZE = 20
+TMDB_MAX_PAGES = 500
+
+def create_session(pool_size: int = None) -> requests.Session:
+    """Keep-alive session with a connection pool.
+
+    Retries are left to MovieAPIClient, so every attempt passes the rate
+    limiter. API_MODE=record saves every response as a fixture and
+    API_MODE=replay serves fixtures instead of using the network.
+    """
+    pool_size = pool_size or config.API_POOL_SIZE
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return apply_mode(session)
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delay or HTTP date), if any"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
 
 class MovieAPIClient:
-    def __init__(self):
+    def __init__(self, session: requests.Session = None, http_cache=None, max_retries: int = None):
         self.tmdb_api_key = config.TMDB_API_KEY
         self.omdb_api_key = config.OMDB_API_KEY
         self.tmdb_base_url = config.TMDB_BASE_URL
         self.omdb_base_url = config.OMDB_BASE_URL
+        self.session = session or create_session()
+        self.timeout = (config.API_CONNECT_TIMEOUT, config.API_READ_TIMEOUT)
+        self.max_retries = config.API_MAX_RETRIES if max_retries is None else max_retries
+        # Record runs must send every request, so they never use the HTTP cache
+        self.http_cache = None if config.API_MODE == 'record' else (http_cache or default_http_cache)
+        # Shared by all threads, so concurrent fetches stay under each API's rate limit
+        self.tmdb_limiter = TokenBucket(config.TMDB_RATE_LIMIT, config.TMDB_RATE_BURST)
+        self.omdb_limiter = TokenBucket(config.OMDB_RATE_LIMIT, config.OMDB_RATE_BURST)
+    
+    def _limiter(self, url: str) -> TokenBucket:
+        return self.omdb_limiter if url.startswith(self.omdb_base_url) else self.tmdb_limiter
+    
+    def _send(self, url: str, params: Dict, headers: Dict = None) -> requests.Response:
+        """Rate-limited GET over the pooled session, with retries and backoff.
+
+        Connection errors, timeouts and API_RETRY_STATUSES (429 and 5xx) are
+        retried up to max_retries times with exponential backoff; a Retry-After
+        header takes precedence. Every attempt takes its own limiter token, so
+        retries count against the API's rate limit too.
+        """
+        limiter = self._limiter(url)
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            last = attempt == self.max_retries
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if last:
+                    raise
+                time.sleep(config.API_BACKOFF_FACTOR * 2 ** attempt)
+                continue
+            if last or response.status_code not in config.API_RETRY_STATUSES:
+                return response
+            delay = retry_after(response)
+            response.close()
+            time.sleep(config.API_BACKOFF_FACTOR * 2 ** attempt if delay is None else delay)
+    
+    def _get(self, url: str, params: Dict, cache: str = None) -> requests.Response:
+        """GET, served from the HTTP cache with the TTL of `cache` when given; raises for error statuses"""
+        if cache and self.http_cache is not None:
+            response = self.http_cache.fetch(url, params, config.HTTP_CACHE_TTLS[cache],
+                                             lambda headers: self._send(url, params, headers))
+        else:
+            response = self._send(url, params)
+        response.raise_for_status()
+        return response
         
     def get_popular_movies(self, page: int = 1) -> List[Dict]:
         """Get popular movies from TMDB"""
@@ -21,8 +106,7 @@ class MovieAPIClient:
                 'page': page,
                 'language': 'en-US'
             }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+            response = self._get(url, params, cache='popular')
             return response.json().get('results', [])
         except Exception as e:
             print(f"Error fetching popular movies: {e}")
@@ -36,8 +120,7 @@ class MovieAPIClient:
                 'api_key': self.tmdb_api_key,
                 'language': 'en-US'
             }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+            response = self._get(url, params, cache='movie_details')
             return response.json()
         except Exception as e:
             print(f"Error fetching movie details for ID {movie_id}: {e}")
@@ -52,8 +135,7 @@ class MovieAPIClient:
                 'query': query,
                 'language': 'en-US'
             }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+            response = self._get(url, params, cache='search')
             return response.json().get('results', [])
         except Exception as e:
             print(f"Error searching movies: {e}")
@@ -66,8 +148,7 @@ class MovieAPIClient:
             params = {
                 'api_key': self.tmdb_api_key
             }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+            response = self._get(url, params, cache='movie_images')
             return response.json()
         except Exception as e:
             print(f"Error fetching movie images for ID {movie_id}: {e}")
@@ -82,8 +163,7 @@ class MovieAPIClient:
                 'i': imdb_id,
                 'plot': 'full'
             }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+            response = self._get(url, params, cache='omdb')
             data = response.json()
             if data.get('Response') == 'True':
                 return data
@@ -100,12 +180,117 @@ class MovieAPIClient:
                 'api_key': self.tmdb_api_key,
                 'page': page
             }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
+            response = self._get(url, params, cache='trending')
             return response.json().get('results', [])
         except Exception as e:
             print(f"Error fetching trending TV shows: {e}")
             return []
 
+    def fetch_many(self, fetch: Callable, items: Iterable, max_workers: int = None) -> List:
+        """fetch(item) for every item on a bounded thread pool, results in input order"""
+        items = list(items)
+        if not items:
+            return []
+        workers = min(max_workers or config.API_CONCURRENCY, len(items))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-fetch') as pool:
+            return list(pool.map(fetch, items))
+    
+    def get_movie_details_many(self, movie_ids: Iterable[int]) -> List[Optional[Dict]]:
+        """get_movie_details for many ids concurrently (None for ids that failed)"""
+        return self.fetch_many(self.get_movie_details, movie_ids)
+    
+    def get_listing_page(self, listing: CatalogListing, page: int) -> Optional[Dict]:
+        """One page of a catalog listing as TMDB returns it (results, total_pages), or None on failure"""
+        try:
+            url = f"{self.tmdb_base_url}{listing.path}"
+            params = dict(listing.params, api_key=self.tmdb_api_key, page=page)
+            response = self._get(url, params, cache=listing.cache)
+            return response.json()
+        except Exception as e:
+            print(f"Error fetching {listing.name} page {page}: {e}")
+            return None
+    
+    def crawl_catalog(self, listings: Iterable[CatalogListing], checkpoint: CrawlCheckpoint = None,
+                      window: int = None) -> Iterator[List[Dict]]:
+        """Distinct titles of several paginated listings, yielded in batches as their pages arrive.
+        
+        Each listing is paged `window` pages at a time on the fetch pool until its
+        limit, its last page or TMDB's page cap is reached. Titles are tagged with
+        their media_type and deduplicated across all listings. With a checkpoint,
+        every batch is saved before it is yielded: a rerun after a crash first
+        yields the titles crawled so far, then continues from the next unfetched
+        page. A page that still fails after retries ends the crawl early, leaving
+        the checkpoint to resume from. The checkpoint is locked for the whole
+        crawl, so another process crawling with it waits until this one ends.
+        """
+        if checkpoint is None:
+            yield from self._crawl_catalog(list(listings), None, window)
+            return
+        with checkpoint.exclusive():
+            yield from self._crawl_catalog(list(listings), checkpoint, window)
+    
+    def _crawl_catalog(self, listings: List[CatalogListing], checkpoint: Optional[CrawlCheckpoint],
+                       window: int = None) -> Iterator[List[Dict]]:
+        window = window or config.API_CONCURRENCY
+        crawled = checkpoint.load(listings) if checkpoint is not None else []
+        seen = {item_key(item) for item in crawled}
+        batch_size = window * TMDB_PAGE_SIZE
+        for start in range(0, len(crawled), batch_size):
+            yield crawled[start:start + batch_size]
+        
+        progress = {}
+        for listing in listings:
+            if checkpoint is not None:
+                state = checkpoint.listing(listing.name)
+            else:
+                state = progress[listing.name] = {'next_page': 1, 'total_pages': None, 'taken': 0, 'done': False}
+            state['done'] = state['done'] or state['taken'] >= listing.limit
+            
+            while not state['done']:
+                first = state['next_page']
+                last = min(state['total_pages'] or TMDB_MAX_PAGES, TMDB_MAX_PAGES)
+                if state['total_pages'] is None:
+                    # Until a page reports total_pages, request only as many pages as the limit needs
+                    count = min(window, math.ceil((listing.limit - state['taken']) / TMDB_PAGE_SIZE))
+                else:
+                    count = window
+                pages = range(first, min(first + count, last + 1))
+                
+                batch = []
+                for page, data in zip(pages, self.fetch_many(lambda p: self.get_listing_page(listing, p), pages)):
+                    if data is None:
+                        break
+                    state['next_page'] = page + 1
+                    state['total_pages'] = min(data.get('total_pages') or page, TMDB_MAX_PAGES)
+                    results = data.get('results', [])
+                    batch.extend(take(results, seen, listing, listing.limit - state['taken'] - len(batch)))
+                    if (not results or state['taken'] + len(batch) >= listing.limit
+                            or page >= state['total_pages']):
+                        state['done'] = True
+                        break
+                
+                if state['next_page'] == first:
+                    print(f"Catalog crawl stopped at {listing.name} page {first}; run again to resume")
+                    return
+                state['taken'] += len(batch)
+                if checkpoint is not None:
+                    checkpoint.commit(batch)
+                if batch:
+                    yield batch
+        
+        if checkpoint is not None:
+            checkpoint.complete()
+    
+    def _crawl_all(self, listing: CatalogListing) -> List[Dict]:
+        return [item for batch in self.crawl_catalog([listing]) for item in batch]
+    
+    def get_popular_movies_bulk(self, count: int) -> List[Dict]:
+        """Top `count` popular movies across as many TMDB pages as needed"""
+        return self._crawl_all(popular_movies(count))
+    
+    def get_trending_tv_shows_bulk(self, count: int) -> List[Dict]:
+        """Top `count` trending TV shows across as many TMDB pages as needed"""
+        return self._crawl_all(trending_tv_shows(count))
+
 # Global API client instance
 api_client = MovieAPIClient()
@@ -0,0 +1,116 @@
+"""
+Record/replay of outbound API traffic for offline, deterministic ingestion runs
+"""
+import base64
+import hashlib
+import json
+import os
+import requests
+from requests.structures import CaseInsensitiveDict
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+from http_cache import SECRET_PARAMS
+import config
+
+def fixture_key(url: str) -> str:
+    """Host-independent identity of a request URL: path plus sorted query, API keys removed.
+
+    Dropping the host lets the same fixtures answer requests sent to the live
+    APIs (replay mode) and to the local stand-in server.
+    """
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in SECRET_PARAMS)
+    return f"{parts.path or '/'}?{urlencode(query)}" if query else (parts.path or '/')
+
+class FixtureStore:
+    """Recorded responses, one JSON file per request in a directory"""
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or config.API_FIXTURES_DIR
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '.json')
+
+    def save(self, url: str, status: int, headers: Dict, body: bytes):
+        key = fixture_key(url)
+        fixture = {
+            'key': key,
+            'status': status,
+            'headers': {k: v for k, v in headers.items() if k.lower() in ('content-type', 'etag', 'last-modified')}
+        }
+        try:
+            fixture['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            fixture['body_b64'] = base64.b64encode(body).decode('ascii')
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(fixture, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _decode(fixture: Dict) -> Dict:
+        if 'body_b64' in fixture:
+            fixture['body'] = base64.b64decode(fixture.pop('body_b64'))
+        else:
+            fixture['body'] = fixture['body'].encode('utf-8')
+        return fixture
+
+    def load(self, url: str) -> Optional[Dict]:
+        """Recorded {status, headers, body} for url, or None"""
+        try:
+            with open(self._path(fixture_key(url))) as f:
+                return self._decode(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def load_all(self) -> Dict[str, Dict]:
+        """Every recorded fixture by key, for serving from memory"""
+        fixtures = {}
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    with open(os.path.join(self.directory, name)) as f:
+                        fixture = self._decode(json.load(f))
+                    fixtures[fixture['key']] = fixture
+        return fixtures
+
+class ReplaySession(requests.Session):
+    """Session that answers every request from recorded fixtures, never touching the network"""
+
+    def __init__(self, store: FixtureStore = None):
+        super().__init__()
+        self.store = store or FixtureStore()
+
+    def send(self, request, **kwargs):
+        fixture = self.store.load(request.url)
+        if fixture is None:
+            raise requests.ConnectionError(f"No recorded response for {fixture_key(request.url)}", request=request)
+        response = requests.Response()
+        response.status_code = fixture['status']
+        response.headers = CaseInsensitiveDict(fixture['headers'])
+        response._content = fixture['body']
+        response.url = request.url
+        response.request = request
+        return response
+
+def apply_mode(session: requests.Session, mode: str = None, store: FixtureStore = None) -> requests.Session:
+    """Session for the configured API_MODE: "live" as is, "record" saving every response, "replay" from fixtures"""
+    mode = mode or config.API_MODE
+    if mode == 'replay':
+        return ReplaySession(store)
+    if mode == 'record':
+        store = store or FixtureStore()
+
+        def record(response, *args, **kwargs):
+            if response.status_code != 304:
+                store.save(response.url, response.status_code, response.headers, response.content)
+            return response
+
+        session.hooks['response'].append(record)
+        return session
+    if mode != 'live':
+        raise ValueError(f"Unknown API_MODE: {mode}")
+    return session
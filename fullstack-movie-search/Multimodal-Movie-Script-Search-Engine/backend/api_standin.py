@@ -0,0 +1,114 @@
+"""
+Local stand-in for TMDB/OMDB/public dataset endpoints, serving recorded fixtures
+
+Serves responses recorded with API_MODE=record, with configurable latency and
+injected errors, so ingestion throughput and retry behaviour can be load
+tested without network access.
+
+Run with:  python api_standin.py --latency 80 --jitter 40 --error-rate 0.05
+Then point the clients at it (and disable the on-disk HTTP cache):
+  TMDB_BASE_URL=http://127.0.0.1:8765/3 OMDB_BASE_URL=http://127.0.0.1:8765
+  WIKIPEDIA_MOVIES_URL=http://127.0.0.1:8765/prust/wikipedia-movie-data/master/movies.json
+  HTTP_CACHE=false
+Request counts are available at /_standin/stats.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from api_replay import FixtureStore, fixture_key
+import config
+
+class StandInServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the fixtures and fault-injection settings"""
+    daemon_threads = True
+
+    def __init__(self, address, fixtures: Dict[str, Dict], latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, retry_after: int = 1, seed: int = None):
+        super().__init__(address, StandInHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'served': 0, 'injected_errors': 0, 'missing': 0}
+
+    def count(self, name: str):
+        with self.lock:
+            self.counts[name] += 1
+
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def inject_error(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, headers: Dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if self.path == '/_standin/stats':
+            with server.lock:
+                body = json.dumps(server.counts).encode('utf-8')
+            return self._send(200, body, {'Content-Type': 'application/json'})
+
+        server.count('requests')
+        time.sleep(server.delay())
+
+        if server.inject_error():
+            server.count('injected_errors')
+            return self._send(server.error_status, b'{"status_message": "Injected error"}',
+                              {'Content-Type': 'application/json', 'Retry-After': str(server.retry_after)})
+
+        fixture = server.fixtures.get(fixture_key(self.path))
+        if fixture is None:
+            server.count('missing')
+            return self._send(404, b'{"status_message": "No recorded response"}', {'Content-Type': 'application/json'})
+
+        server.count('served')
+        headers = dict(fixture['headers'])
+        if headers.get('ETag') and self.headers.get('If-None-Match') == headers['ETag']:
+            return self._send(304, b'', {'ETag': headers['ETag']})
+        self._send(fixture['status'], fixture['body'], headers)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', default=config.API_FIXTURES_DIR, help='directory of recorded responses')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='added latency per request, in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='uniform +/- latency jitter, in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with injected errors')
+    parser.add_argument('--seed', type=int, default=None, help='seed for reproducible latency and errors')
+    args = parser.parse_args()
+
+    fixtures = FixtureStore(args.fixtures).load_all()
+    server = StandInServer((args.host, args.port), fixtures, args.latency / 1000.0, args.jitter / 1000.0,
+                           args.error_rate, args.error_status, args.retry_after, args.seed)
+    print(f"Serving {len(fixtures)} recorded responses on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
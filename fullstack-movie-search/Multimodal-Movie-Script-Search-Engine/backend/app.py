@@ -1,5 +1,6 @@
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
+from compression import register_flask_compression
 import numpy as np
 import torch
 from PIL import Image
@@ -11,16 +12,31 @@ from transformers import CLIPProcessor, CLIPModel, BartForConditionalGeneration,
 from sklearn.metrics.pairwise import cosine_similarity
 import warnings
 import os
+from response_cache import flask_response
+from request_parsing import get_page_params
+from search_engine import check_page_bounds
+from dataset_payload import DatasetPayload
+from image_ingest import ImageRejected, decode_image
+from image_embedding_cache import ImageEmbeddingCache
+from image_pipeline import DedupEncoder
+import config
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
 CORS(app)
+register_flask_compression(app)
 
 # Global variables for models and data
 models = {}
 embeddings = {}
 dataset = {}
 
+# /api/dataset listing, serialized and compressed once per dataset
+dataset_payload = None
+
+# CLIP embeddings of uploaded query images by perceptual hash
+image_embedding_cache = ImageEmbeddingCache()
+
 def initialize_models():
     """Initialize all pre-trained models"""
     print("Loading models...")
@@ -215,6 +231,8 @@ def create_comprehensive_dataset():
     
     # Create corresponding images for each dialogue with more diverse and accurate representations
     images = []
+    # One shared image per theme colour; they would be byte-identical anyway
+    placeholders = {}
     
     for i, dialogue in enumerate(dialogues):
         # Create more diverse colored images that match the movie themes
@@ -229,7 +247,9 @@ def create_comprehensive_dataset():
         else:
             color = (100, 100, 100)  # Neutral theme
             
-        img = Image.new('RGB', (400, 300), color=color)
+        img = placeholders.get(color)
+        if img is None:
+            img = placeholders[color] = Image.new('RGB', (400, 300), color=color)
         images.append({
             "id": dialogue["id"],
             "image": img,
@@ -263,33 +283,53 @@ def compute_embeddings():
     embeddings['text'] = np.vstack(text_embeddings)
     print("✓ Text embeddings computed")
     
-    # Image embeddings
-    image_embeddings = []
-    for img_data in dataset['images']:
-        inputs = models['clip_processor'](images=img_data["image"], return_tensors="pt")
+    # Image embeddings, IMAGE_BATCH_SIZE images per CLIP forward pass, each distinct image encoded once
+    def encode_images(images):
+        inputs = models['clip_processor'](images=images, return_tensors="pt")
         inputs = {k: v.to(models['device']) for k, v in inputs.items()}
         
         with torch.no_grad():
-            image_features = models['clip'].get_image_features(**inputs)
-            image_embeddings.append(image_features.cpu().numpy())
+            return models['clip'].get_image_features(**inputs).cpu().numpy()
     
-    embeddings['image'] = np.vstack(image_embeddings)
+    encoder = DedupEncoder(encode_images)
+    embeddings['image'] = np.vstack(encoder.encode(img_data["image"] for img_data in dataset['images']))
+    print(f"✓ {encoder.encoded} distinct images encoded, {encoder.reused} duplicates reused")
     print("✓ Image embeddings computed")
 
+def encode_query_image(image):
+    """CLIP embedding of a decoded upload, reused for repeated or near-identical images"""
+    def compute():
+        inputs = models['clip_processor'](images=image, return_tensors="pt")
+        inputs = {k: v.to(models['device']) for k, v in inputs.items()}
+        with torch.no_grad():
+            return models['clip'].get_image_features(**inputs).cpu().numpy()
+    
+    embedding, _ = image_embedding_cache.get_or_compute(image, compute)
+    return embedding
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "models_loaded": len(models) > 0})
+    return jsonify({
+        "status": "healthy",
+        "models_loaded": len(models) > 0,
+        "image_embedding_cache": image_embedding_cache.stats()
+    })
 
 @app.route('/api/search/dialogue-to-scene', methods=['POST'])
 def dialogue_to_scene():
     """Search for scenes based on dialogue input"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         query_text = data.get('dialogue', '')
         
         if not query_text:
             return jsonify({"error": "Dialogue text is required"}), 400
+        try:
+            offset, limit, _ = get_page_params(data, request.args, default_limit=6)
+            check_page_bounds(offset, limit)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         # Encode query text using CLIP text encoder
         inputs = models['clip_processor'](text=[query_text], return_tensors="pt", padding=True)
@@ -305,13 +345,13 @@ def dialogue_to_scene():
         similarity_threshold = 0.1
         valid_indices = np.where(similarities >= similarity_threshold)[0]
         
+        # Candidates best first; the diversity filter below walks them until the
+        # page is filled, however many repeated movies it has to skip
         if len(valid_indices) == 0:
-            # If no results meet threshold, get top 5
-            top_indices = np.argsort(similarities)[::-1][:5]
+            # If no results meet threshold, fall back to the overall best
+            top_indices = np.argsort(similarities)[::-1]
         else:
-            # Sort valid results by similarity and take top 8 for diversity
-            sorted_valid = valid_indices[np.argsort(similarities[valid_indices])[::-1]]
-            top_indices = sorted_valid[:8]
+            top_indices = valid_indices[np.argsort(similarities[valid_indices])[::-1]]
         
         results = []
         seen_movies = set()
@@ -334,13 +374,17 @@ def dialogue_to_scene():
                 })
                 seen_movies.add(img_data["movie"])
                 
-            if len(results) >= 6:  # Return up to 6 diverse results
+            if len(results) >= offset + limit:  # Stop once the requested page is filled
                 break
+        
+        results = results[offset:]
                 
         return jsonify({
             "query": query_text,
             "results": results,
-            "total_results": len(results)
+            "total_results": len(results),
+            "offset": offset,
+            "limit": limit
         })
         
     except Exception as e:
@@ -357,19 +401,21 @@ def scene_to_dialogue():
         if file.filename == '':
             return jsonify({"error": "No image selected"}), 400
         
-        # Process uploaded image
-        image = Image.open(file.stream)
-        inputs = models['clip_processor'](images=image, return_tensors="pt")
-        inputs = {k: v.to(models['device']) for k, v in inputs.items()}
+        try:
+            offset, limit, _ = get_page_params(request.form, request.args, default_limit=3)
+            check_page_bounds(offset, limit)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        with torch.no_grad():
-            query_embedding = models['clip'].get_image_features(**inputs).cpu().numpy()
+        # Process uploaded image (decoded straight to CLIP resolution)
+        decoded = decode_image(file.stream)
+        query_embedding = encode_query_image(decoded.image)
         
         # Compute similarities with text embeddings
         similarities = cosine_similarity(query_embedding, embeddings['text'])[0]
         
-        # Get top-3 results
-        top_indices = np.argsort(similarities)[::-1][:3]
+        # Get the requested page of results
+        top_indices = np.argsort(similarities)[::-1][offset:offset + limit]
         
         results = []
         for idx in top_indices:
@@ -383,11 +429,17 @@ def scene_to_dialogue():
                 "similarity": float(similarities[idx])
             })
         
-        return jsonify({
+        response = jsonify({
             "results": results,
-            "total_results": len(results)
+            "total_results": len(results),
+            "offset": offset,
+            "limit": limit
         })
+        response.headers['Server-Timing'] = decoded.server_timing()
+        return response
         
+    except ImageRejected as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -411,13 +463,9 @@ def contextual_search():
         # Encode query text
         text_query_embedding = models['text'].encode([query_text])
         
-        # Process uploaded image
-        image = Image.open(file.stream)
-        inputs = models['clip_processor'](images=image, return_tensors="pt")
-        inputs = {k: v.to(models['device']) for k, v in inputs.items()}
-        
-        with torch.no_grad():
-            image_query_embedding = models['clip'].get_image_features(**inputs).cpu().numpy()
+        # Process uploaded image (decoded straight to CLIP resolution)
+        decoded = decode_image(file.stream)
+        image_query_embedding = encode_query_image(decoded.image)
         
         # Compute combined similarities
         text_similarities = cosine_similarity(text_query_embedding, embeddings['text'])[0]
@@ -446,12 +494,16 @@ def contextual_search():
                 "combined_similarity": float(combined_similarities[idx])
             })
         
-        return jsonify({
+        response = jsonify({
             "query": query_text,
             "results": results,
             "total_results": len(results)
         })
+        response.headers['Server-Timing'] = decoded.server_timing()
+        return response
         
+    except ImageRejected as e:
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -538,19 +590,37 @@ def generate_creative_text():
 
 @app.route('/api/dataset', methods=['GET'])
 def get_dataset():
-    """Get the dummy dataset for frontend display"""
-    return jsonify({
-        "dialogues": dataset['dialogues'],
-        "images": [
-            {
-                "id": img["id"],
-                "movie": img["movie"],
-                "description": img["description"],
-                "url": img["url"]
-            }
-            for img in dataset['images']
-        ]
-    })
+    """Get the dummy dataset for frontend display (all of it, or a page with ?offset=&limit=)"""
+    global dataset_payload
+    try:
+        paged = 'offset' in request.args or 'limit' in request.args
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    if offset < 0 or not 1 <= limit <= 100:
+        return jsonify({"error": "offset must be >= 0 and limit between 1 and 100"}), 400
+    
+    # Rebuilt only when the dataset lists are replaced
+    version = (id(dataset.get('dialogues')), id(dataset.get('images')))
+    payload = dataset_payload
+    if payload is None or payload.version != version:
+        payload = DatasetPayload({
+            "dialogues": dataset['dialogues'],
+            "images": [
+                {
+                    "id": img["id"],
+                    "movie": img["movie"],
+                    "description": img["description"],
+                    "url": img["url"]
+                }
+                for img in dataset['images']
+            ]
+        }, version=version)
+        dataset_payload = payload
+    
+    body = payload.page(offset, limit) if paged else payload.full
+    return flask_response(body, config.STATIC_CACHE_CONTROL)
 
 if __name__ == '__main__':
     print("Initializing Multimodal Movie Script Search Engine...")
@@ -0,0 +1,261 @@
+"""
+ASGI application for Multimodal Movie Script Search Engine
+
+Same API as app_refactored.py, but request parsing and I/O run on an asyncio
+event loop while text encoding, BART and GPT-2 calls run in a bounded
+executor with per-endpoint concurrency limits (config.ENDPOINT_CONCURRENCY),
+so slow generation requests cannot starve fast searches.
+
+Run with:  python app_async.py   or   uvicorn app_async:app --host 0.0.0.0 --port 5001
+"""
+import asyncio
+import contextlib
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+import config
+from models import model_manager
+from data_manager import data_manager
+from search_engine import SearchEngine
+from metadata_index import filters_to_spec
+from inference_executor import InferenceExecutor, EndpointSaturated
+from request_parsing import get_filters, parse_search_request, page_response, parse_batch_queries
+from response_cache import CONDITIONAL_METHODS, ResponseCache, build_response, etag_matches, request_key
+import search_engine as search_engine_module
+
+executor = InferenceExecutor()
+response_cache = ResponseCache()
+
+def initialize_application():
+    """Load models, build the dataset and compute embeddings (blocking)"""
+    print("Initializing Multimodal Movie Script Search Engine (async mode)...")
+
+    model_manager.load_models()
+    data_manager.load_dataset(model_manager)
+    search_engine_module.search_engine = SearchEngine(model_manager, data_manager)
+    # Raw result pages must be byte-identical to serializing the record copies
+    search_engine_module.search_engine.check_raw_results()
+
+    print("✓ All models and embeddings loaded successfully!")
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Startup work is blocking too, so keep it off the event loop
+    if search_engine_module.search_engine is None:
+        await asyncio.get_running_loop().run_in_executor(None, initialize_application)
+    print("Starting ASGI server...")
+    yield
+    executor.shutdown()
+
+async def read_json(request: Request):
+    """Parse the request body as JSON; None when it is missing or malformed"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+def error(message, status):
+    return JSONResponse({'error': message}, status_code=status)
+
+def saturated(e: EndpointSaturated):
+    """503 with Retry-After for a request rejected by a full worker pool"""
+    return JSONResponse({'error': str(e)}, status_code=503, headers={'Retry-After': str(e.retry_after)})
+
+async def dataset_version():
+    """Current dataset identity, after picking up any newly published shared embeddings"""
+    if data_manager.shared_registry is not None:
+        # Attaching a generation loads arrays and rebuilds the metadata indexes,
+        # so it runs on a thread instead of stalling every request on the loop
+        await asyncio.get_running_loop().run_in_executor(None, data_manager.refresh_shared)
+    return data_manager.version
+
+def json_response(request: Request, cached, cache_control: str = None):
+    """Serve a serialized body in the client's preferred encoding, or 304 when a GET already has it"""
+    body, headers = cached.representation(request.headers.get('accept-encoding'))
+    if request.method not in CONDITIONAL_METHODS:
+        # POST searches are never HTTP-cached, so they always get the body
+        return Response(body, media_type='application/json', headers=headers)
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+    if etag_matches(request.headers.get('if-none-match'), headers['ETag']):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+async def cached_json(request: Request, route: str, data, build, endpoint='search',
+                      cache_control: str = None):
+    """Response for build()'s payload, reused for identical requests on the same dataset.
+
+    Cache hits are answered on the event loop; misses run build on the endpoint's pool.
+    """
+    key = request_key(route, data, request.query_params.multi_items(), await dataset_version())
+    cached = response_cache.get(key)
+    if cached is None:
+        cached = await executor.run(endpoint, response_cache.fill, key, build)
+    return json_response(request, cached, cache_control)
+
+async def paged_search(request: Request, query_type: str, field: str, missing_message: str):
+    """Shared handler for the dialogue-to-scene and scene-to-dialogue routes"""
+    try:
+        data = await read_json(request) or {}
+        query = data.get(field, '')
+
+        if not query and not data.get('cursor'):
+            return error(missing_message, 400)
+
+        search = parse_search_request(query_type, query, data, request.query_params)
+
+        def build():
+            page = search_engine_module.search_engine.search_page(
+                search['query_type'], search['query'], search['filters'], search['offset'], search['limit'],
+                raw_results=True)
+            return page_response(search, page)
+
+        return await cached_json(request, query_type, data, build)
+
+    except EndpointSaturated as e:
+        return saturated(e)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+async def dialogue_to_scene(request: Request):
+    """Search for scenes based on dialogue input"""
+    return await paged_search(request, 'dialogue', 'dialogue', 'Dialogue is required')
+
+async def scene_to_dialogue(request: Request):
+    """Search for dialogues based on scene description"""
+    return await paged_search(request, 'scene', 'scene_description', 'Scene description is required')
+
+async def contextual_search(request: Request):
+    """Perform contextual search combining dialogue and scene matching"""
+    try:
+        data = await read_json(request) or {}
+        query = data.get('query', '')
+
+        if not query:
+            return error('Query is required', 400)
+
+        filters = get_filters(data, request.query_params)
+
+        def build():
+            results = search_engine_module.search_engine.contextual_search(query, filters)
+            return {
+                'query': query,
+                'filters': filters_to_spec(filters),
+                'results': results,
+                'total_results': len(results)
+            }
+
+        return await cached_json(request, 'contextual', data, build)
+
+    except EndpointSaturated as e:
+        return saturated(e)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+async def batch_search(request: Request):
+    """Run many dialogue-to-scene / scene-to-dialogue queries in one request"""
+    try:
+        data = await read_json(request)
+        parsed = parse_batch_queries(data)
+
+        def build():
+            results = search_engine_module.search_engine.search_batch(parsed, raw_results=True)
+            return {
+                'results': results,
+                'total_queries': len(results)
+            }
+
+        return await cached_json(request, 'batch', data, build)
+
+    except EndpointSaturated as e:
+        return saturated(e)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e), 500)
+
+async def summarize(request: Request):
+    """Summarize given text"""
+    try:
+        data = await read_json(request) or {}
+        text = data.get('text', '')
+
+        if not text:
+            return error('Text is required', 400)
+
+        result = await executor.run('summarize', search_engine_module.search_engine.summarize_text, text)
+        return json_response(request, build_response(result))
+
+    except EndpointSaturated as e:
+        return saturated(e)
+    except Exception as e:
+        return error(str(e), 500)
+
+async def generate(request: Request):
+    """Generate script based on prompt"""
+    try:
+        data = await read_json(request) or {}
+        prompt = data.get('prompt', '')
+
+        if not prompt:
+            return error('Prompt is required', 400)
+
+        result = await executor.run('generate', search_engine_module.search_engine.generate_script, prompt)
+        return json_response(request, build_response(result))
+
+    except EndpointSaturated as e:
+        return saturated(e)
+    except Exception as e:
+        return error(str(e), 500)
+
+async def health_check(request: Request):
+    """Health check endpoint"""
+    return json_response(request, build_response({
+        'status': 'healthy',
+        'models_loaded': search_engine_module.search_engine is not None,
+        'total_dialogues': len(data_manager.dialogues),
+        'total_scenes': len(data_manager.scenes),
+        'embeddings_generation': data_manager.generation,
+        'workloads': executor.stats(),
+        'coalescing': search_engine_module.search_engine.in_flight.stats() if search_engine_module.search_engine else None,
+        'response_cache': response_cache.stats()
+    }), config.HEALTH_CACHE_CONTROL)
+
+async def get_stats(request: Request):
+    """Get application statistics"""
+    key = request_key('stats', None, (), await dataset_version())
+    return json_response(request, response_cache.get_or_build(key, lambda: {
+        'total_dialogues': len(data_manager.dialogues),
+        'total_scenes': len(data_manager.scenes),
+        'max_results': config.MAX_RESULTS,
+        'max_page_size': config.MAX_PAGE_SIZE,
+        'similarity_threshold': config.SIMILARITY_THRESHOLD,
+        'endpoint_concurrency': executor.limits,
+        'endpoint_queue_depth': executor.queue_depths
+    }), config.STATIC_CACHE_CONTROL)
+
+app = Starlette(
+    routes=[
+        Route('/api/search/dialogue-to-scene', dialogue_to_scene, methods=['POST']),
+        Route('/api/search/scene-to-dialogue', scene_to_dialogue, methods=['POST']),
+        Route('/api/search/contextual', contextual_search, methods=['POST']),
+        Route('/api/search/batch', batch_search, methods=['POST']),
+        Route('/api/summarize', summarize, methods=['POST']),
+        Route('/api/generate', generate, methods=['POST']),
+        Route('/api/health', health_check, methods=['GET']),
+        Route('/api/stats', get_stats, methods=['GET']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host=config.HOST, port=config.PORT)
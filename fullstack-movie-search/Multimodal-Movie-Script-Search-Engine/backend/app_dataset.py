@@ -6,6 +6,7 @@ import json
 import numpy as np
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from compression import register_flask_compression
 import requests
 from PIL import Image
 import io
@@ -14,6 +15,7 @@ import re
 
 app = Flask(__name__)
 CORS(app)
+register_flask_compression(app)
 
 class DatasetMovieSearchEngine:
     def __init__(self):
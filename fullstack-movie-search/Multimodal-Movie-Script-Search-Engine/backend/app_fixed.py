@@ -8,6 +8,11 @@ import random
 import re
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from compression import register_flask_compression
+from single_flight import SingleFlight
+from response_cache import flask_response
+from dataset_payload import DatasetPayload
+import config
 
 # AI/ML imports
 try:
@@ -24,6 +29,7 @@ import time
 
 app = Flask(__name__)
 CORS(app)
+register_flask_compression(app)
 
 class FixedMovieSearchEngine:
     def __init__(self):
@@ -36,6 +42,9 @@ class FixedMovieSearchEngine:
         self.tfidf_matrix = None
         self.corpus_texts = []
         
+        # Identical searches/summaries running at the same time share one computation
+        self.in_flight = SingleFlight()
+        
         if AI_MODELS_AVAILABLE:
             try:
                 print("Initializing TF-IDF vectorizer...")
@@ -552,8 +561,13 @@ class FixedMovieSearchEngine:
         
         return 0
     
-    def search_dialogue_to_scene(self, dialogue_query):
+    def search_dialogue_to_scene(self, dialogue_query, offset=0, limit=3):
         """Enhanced dialogue to scene search with movie diversity"""
+        # Scoring lowercases and tokenizes the query, so case/whitespace variants are the same search
+        key = ('dialogue-to-scene', ' '.join(dialogue_query.lower().split()), offset, limit)
+        return self.in_flight.do(key, self._search_dialogue_to_scene, dialogue_query, offset, limit)
+    
+    def _search_dialogue_to_scene(self, dialogue_query, offset, limit):
         if not self.scenes_data:
             return []
         
@@ -574,7 +588,7 @@ class FixedMovieSearchEngine:
         # Sort by similarity
         all_results.sort(key=lambda x: x['similarity'], reverse=True)
         
-        # Ensure diversity - only one scene per movie in top 3 results
+        # Ensure diversity - only one scene per movie in the requested page
         diverse_results = []
         seen_movies = set()
         
@@ -584,13 +598,13 @@ class FixedMovieSearchEngine:
                 diverse_results.append(result)
                 seen_movies.add(movie_name)
                 
-            # Stop when we have 3 diverse results
-            if len(diverse_results) >= 3:
+            # Stop when the requested page is filled
+            if len(diverse_results) >= offset + limit:
                 break
         
-        return diverse_results
+        return diverse_results[offset:]
     
-    def search_scene_to_dialogue(self, image_file):
+    def search_scene_to_dialogue(self, image_file, offset=0, limit=3):
         """Enhanced scene to dialogue search with better similarity distribution"""
         if not self.dialogs_data:
             return []
@@ -667,7 +681,7 @@ class FixedMovieSearchEngine:
         # Sort by similarity
         results.sort(key=lambda x: x['similarity'], reverse=True)
         
-        # Ensure diversity - only one dialogue per movie in top 3 results
+        # Ensure diversity - only one dialogue per movie in the requested page
         diverse_results = []
         seen_movies = set()
         
@@ -677,11 +691,11 @@ class FixedMovieSearchEngine:
                 diverse_results.append(result)
                 seen_movies.add(movie_name)
                 
-            # Stop when we have 3 diverse results
-            if len(diverse_results) >= 3:
+            # Stop when the requested page is filled
+            if len(diverse_results) >= offset + limit:
                 break
         
-        return diverse_results
+        return diverse_results[offset:]
     
     def contextual_search(self, dialogue_query, image_file):
         """Enhanced contextual search with movie diversity"""
@@ -1048,6 +1062,17 @@ FADE OUT.""")
 print("Initializing Fixed Movie Search Engine with Enhanced Similarity...")
 search_engine = FixedMovieSearchEngine()
 
+# /api/dataset listing, serialized and compressed once per dataset
+dataset_payload = None
+
+def get_page_params(source):
+    """Read offset/limit pagination parameters from a request body or form"""
+    offset = int(source.get('offset', request.args.get('offset', 0)))
+    limit = int(source.get('limit', request.args.get('limit', 3)))
+    if offset < 0 or not 1 <= limit <= 100:
+        raise ValueError('offset must be >= 0 and limit between 1 and 100')
+    return offset, limit
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
@@ -1074,11 +1099,18 @@ def dialogue_to_scene():
         return jsonify({'error': 'Dialogue query is required'}), 400
     
     try:
-        results = search_engine.search_dialogue_to_scene(dialogue)
+        offset, limit = get_page_params(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        results = search_engine.search_dialogue_to_scene(dialogue, offset, limit)
         return jsonify({
             'query': dialogue,
             'results': results,
             'total_results': len(results),
+            'offset': offset,
+            'limit': limit,
             'data_source': 'Enhanced similarity algorithm with keyword matching'
         })
     except Exception as e:
@@ -1090,11 +1122,18 @@ def scene_to_dialogue():
         return jsonify({'error': 'Image file is required'}), 400
     
     try:
-        results = search_engine.search_scene_to_dialogue(request.files['image'])
+        offset, limit = get_page_params(request.form)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        results = search_engine.search_scene_to_dialogue(request.files['image'], offset, limit)
         return jsonify({
             'query': 'uploaded_image',
             'results': results,
             'total_results': len(results),
+            'offset': offset,
+            'limit': limit,
             'data_source': 'Enhanced dialogue scoring with famous quotes'
         })
     except Exception as e:
@@ -1120,15 +1159,31 @@ def contextual_search():
 
 @app.route('/api/dataset', methods=['GET'])
 def get_dataset():
-    return jsonify({
-        'movies': search_engine.movies_data[:10],
-        'dialogues': [{'movie': d['movie'], 'character': d['character'], 'text': d['text'][:100] + '...' if len(d['text']) > 100 else d['text']} for d in search_engine.dialogs_data[:10]],
-        'scenes': [{'movie': s['movie'], 'description': s['description'][:100] + '...' if len(s['description']) > 100 else s['description']} for s in search_engine.scenes_data[:10]],
-        'total_movies': len(search_engine.movies_data),
-        'total_dialogues': len(search_engine.dialogs_data),
-        'total_scenes': len(search_engine.scenes_data),
-        'improvements': ['Enhanced keyword matching', 'Better similarity algorithms', 'Improved dialogue-scene mapping']
-    })
+    global dataset_payload
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    if offset < 0 or not 1 <= limit <= 100:
+        return jsonify({'error': 'offset must be >= 0 and limit between 1 and 100'}), 400
+    
+    # Text is truncated and every item serialized once, not per request
+    version = (id(search_engine.movies_data), id(search_engine.dialogs_data), id(search_engine.scenes_data))
+    payload = dataset_payload
+    if payload is None or payload.version != version:
+        payload = dataset_payload = DatasetPayload({
+            'movies': search_engine.movies_data,
+            'dialogues': [{'movie': d['movie'], 'character': d['character'], 'text': d['text'][:100] + '...' if len(d['text']) > 100 else d['text']} for d in search_engine.dialogs_data],
+            'scenes': [{'movie': s['movie'], 'description': s['description'][:100] + '...' if len(s['description']) > 100 else s['description']} for s in search_engine.scenes_data]
+        }, extra={
+            'total_movies': len(search_engine.movies_data),
+            'total_dialogues': len(search_engine.dialogs_data),
+            'total_scenes': len(search_engine.scenes_data),
+            'improvements': ['Enhanced keyword matching', 'Better similarity algorithms', 'Improved dialogue-scene mapping']
+        }, version=version)
+    
+    return flask_response(payload.page(offset, limit), config.STATIC_CACHE_CONTROL)
 
 @app.route('/api/summarize', methods=['POST'])
 def summarize():
@@ -8,69 +8,111 @@ import numpy as np
 import requests
 import random
 import re
+import threading
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from urllib.parse import quote
+from compression import register_flask_compression
+from http_cache import http_cache
+from api_replay import apply_mode
+import config
 import time
 
 app = Flask(__name__)
 CORS(app)
+register_flask_compression(app)
 
 class PublicDatasetEngine:
-    def __init__(self):
+    def __init__(self, background=True):
         # API Keys (you can get free keys from these services)
         self.tmdb_api_key = "your_tmdb_api_key_here"  # Get from https://www.themoviedb.org/settings/api
         self.omdb_api_key = "your_omdb_api_key_here"  # Get from http://www.omdbapi.com/apikey.aspx
         
         # Public dataset URLs
         self.cornell_dialogs_url = "https://raw.githubusercontent.com/suriyadeepan/datasets/master/movie_lines.txt"
-        self.movie_metadata_url = "https://raw.githubusercontent.com/prust/wikipedia-movie-data/master/movies.json"
+        self.movie_metadata_url = config.WIKIPEDIA_MOVIES_URL
+        # Keep-alive session; records or replays traffic when API_MODE says so
+        self.session = apply_mode(requests.Session())
         
-        # Cache for downloaded data
-        self.movies_cache = []
-        self.dialogs_cache = []
-        self.scenes_cache = []
+        # (movies, dialogs, scenes), replaced as a whole so readers never see a mix of two loads
+        self.dataset = ([], [], [])
+        self.load_status = {'state': 'pending', 'source': None, 'error': None, 'duration_ms': None}
+        self.loaded = threading.Event()
         
-        # Initialize with public data
-        self.load_public_datasets()
+        # Serve the bundled data right away; the remote dataset is merged in when it arrives
+        self.build_dataset(self.load_fallback_movies(), 'fallback')
+        if background:
+            threading.Thread(target=self.load_public_datasets, name='public-dataset-loader', daemon=True).start()
+        else:
+            self.load_public_datasets()
     
-    def load_public_datasets(self):
-        """Load data from public sources"""
-        print("Loading public movie datasets...")
-        
-        # Load Wikipedia movie data
-        self.load_wikipedia_movies()
-        
+    @property
+    def movies_cache(self):
+        return self.dataset[0]
+    
+    @property
+    def dialogs_cache(self):
+        return self.dataset[1]
+    
+    @property
+    def scenes_cache(self):
+        return self.dataset[2]
+    
+    def build_dataset(self, movies, source):
+        """Derive dialogs and scenes from movies and swap all three in at once"""
         # Load sample movie dialogs (using a curated list since Cornell dataset is large)
-        self.load_sample_dialogs()
-        
+        dialogs = self.load_sample_dialogs(movies)
         # Generate scenes from movie data
-        self.generate_scenes_from_movies()
+        scenes = self.generate_scenes_from_movies(movies)
+        self.dataset = (movies, dialogs, scenes)
+        self.load_status['source'] = source
         
-        print(f"✓ Loaded {len(self.movies_cache)} movies")
-        print(f"✓ Generated {len(self.dialogs_cache)} dialogs")
-        print(f"✓ Generated {len(self.scenes_cache)} scenes")
+        print(f"✓ Loaded {len(movies)} movies ({source})")
+        print(f"✓ Generated {len(dialogs)} dialogs")
+        print(f"✓ Generated {len(scenes)} scenes")
+    
+    def load_public_datasets(self):
+        """Load data from public sources and merge it over the fallback data"""
+        print("Loading public movie datasets...")
+        self.load_status['state'] = 'loading'
+        start = time.time()
+        try:
+            movies = self.load_wikipedia_movies()
+            if movies:
+                # Keep the fallback titles the curated dialogs refer to
+                titles = {movie.get('title') for movie in movies}
+                merged = movies + [movie for movie in self.load_fallback_movies() if movie['title'] not in titles]
+                self.build_dataset(merged, 'wikipedia')
+                self.load_status['state'] = 'loaded'
+            else:
+                self.load_status['state'] = 'failed'
+        except Exception as e:
+            print(f"Error building public dataset: {e}")
+            self.load_status.update(state='failed', error=str(e))
+        finally:
+            self.load_status['duration_ms'] = round((time.time() - start) * 1000, 1)
+            self.loaded.set()
     
     def load_wikipedia_movies(self):
-        """Load movie data from Wikipedia dataset"""
+        """Load movie data from Wikipedia dataset; None if it is unavailable"""
         try:
             print("Fetching Wikipedia movie dataset...")
-            response = requests.get(self.movie_metadata_url, timeout=10)
+            response = self.cached_get(self.movie_metadata_url, None, 'public_dataset', timeout=10)
             if response.status_code == 200:
                 movies_data = response.json()
                 # Take first 100 movies to avoid overwhelming the system
-                self.movies_cache = movies_data[:100]
-                print(f"✓ Loaded {len(self.movies_cache)} movies from Wikipedia")
-            else:
-                print("Failed to load Wikipedia dataset, using fallback data")
-                self.load_fallback_movies()
+                movies = movies_data[:100]
+                print(f"✓ Loaded {len(movies)} movies from Wikipedia")
+                return movies
+            print("Failed to load Wikipedia dataset, using fallback data")
+            self.load_status['error'] = f"HTTP {response.status_code}"
         except Exception as e:
             print(f"Error loading Wikipedia dataset: {e}")
-            self.load_fallback_movies()
+            self.load_status['error'] = str(e)
+        return None
     
     def load_fallback_movies(self):
         """Fallback movie data if public sources fail"""
-        self.movies_cache = [
+        return [
             {"title": "The Shawshank Redemption", "year": 1994, "genre": ["Drama"], "cast": ["Tim Robbins", "Morgan Freeman"]},
             {"title": "The Godfather", "year": 1972, "genre": ["Crime", "Drama"], "cast": ["Marlon Brando", "Al Pacino"]},
             {"title": "The Dark Knight", "year": 2008, "genre": ["Action", "Crime", "Drama"], "cast": ["Christian Bale", "Heath Ledger"]},
@@ -88,7 +130,7 @@ class PublicDatasetEngine:
             {"title": "Lagaan", "year": 2001, "genre": ["Adventure", "Drama", "Musical"], "cast": ["Aamir Khan", "Gracy Singh"]},
         ]
     
-    def load_sample_dialogs(self):
+    def load_sample_dialogs(self, movies):
         """Load sample movie dialogs from famous movies"""
         famous_dialogs = [
             {"movie": "The Shawshank Redemption", "character": "Andy Dufresne", "text": "Hope is a good thing, maybe the best of things, and no good thing ever dies.", "scene": "Prison cell conversation"},
@@ -109,11 +151,12 @@ class PublicDatasetEngine:
         ]
         
         # Convert to our format and add more details
+        dialogs = []
         dialog_id = 1
         for dialog in famous_dialogs:
-            movie_info = next((m for m in self.movies_cache if m.get('title') == dialog['movie']), {})
+            movie_info = next((m for m in movies if m.get('title') == dialog['movie']), {})
             
-            self.dialogs_cache.append({
+            dialogs.append({
                 'id': dialog_id,
                 'movie': dialog['movie'],
                 'dialogue': dialog['text'],
@@ -127,8 +170,9 @@ class PublicDatasetEngine:
                 'similarity': 0.0
             })
             dialog_id += 1
+        return dialogs
     
-    def generate_scenes_from_movies(self):
+    def generate_scenes_from_movies(self, movies):
         """Generate scene data from movie information"""
         scene_descriptions = [
             "Epic battle scene with stunning visual effects",
@@ -143,12 +187,13 @@ class PublicDatasetEngine:
             "Climactic showdown between hero and villain"
         ]
         
+        scenes = []
         scene_id = 1
-        for movie in self.movies_cache[:50]:  # Generate scenes for first 50 movies
+        for movie in movies[:50]:  # Generate scenes for first 50 movies
             # Generate 2-3 scenes per movie
             num_scenes = random.randint(2, 3)
             for i in range(num_scenes):
-                self.scenes_cache.append({
+                scenes.append({
                     'id': scene_id,
                     'movie': movie.get('title', 'Unknown'),
                     'description': random.choice(scene_descriptions),
@@ -162,6 +207,7 @@ class PublicDatasetEngine:
                     'similarity': 0.0
                 })
                 scene_id += 1
+        return scenes
     
     def get_sample_video_url(self, scene_id):
         """Get sample video URLs"""
@@ -174,14 +220,22 @@ class PublicDatasetEngine:
         ]
         return videos[scene_id % len(videos)]
     
+    def cached_get(self, url, params, cache, timeout):
+        """GET through the on-disk HTTP cache (TTL class `cache`), or straight to the network without one"""
+        send = lambda headers: self.session.get(url, params=params, headers=headers, timeout=timeout)
+        if http_cache is None:
+            return send({})
+        return http_cache.fetch(url, params, config.HTTP_CACHE_TTLS[cache], send)
+    
     def fetch_tmdb_data(self, query):
         """Fetch data from TMDB API"""
         if self.tmdb_api_key == "your_tmdb_api_key_here":
             return None
         
         try:
-            url = f"https://api.themoviedb.org/3/search/movie?api_key={self.tmdb_api_key}&query={quote(query)}"
-            response = requests.get(url, timeout=5)
+            url = f"{config.TMDB_BASE_URL}/search/movie"
+            params = {'api_key': self.tmdb_api_key, 'query': query}
+            response = self.cached_get(url, params, 'search', timeout=5)
             if response.status_code == 200:
                 return response.json()
         except Exception as e:
@@ -222,16 +276,17 @@ class PublicDatasetEngine:
     
     def search_dialogue_to_scene(self, dialogue_query):
         """Search scenes based on dialogue query"""
-        if not self.scenes_cache:
+        scenes = self.scenes_cache
+        if not scenes:
             return []
         
         # Search in scene descriptions and movie titles
-        search_texts = [f"{scene['description']} {scene['movie']}" for scene in self.scenes_cache]
+        search_texts = [f"{scene['description']} {scene['movie']}" for scene in scenes]
         similarities = self.compute_similarity(dialogue_query, search_texts)
         
         # Create results with similarities
         results = []
-        for i, scene in enumerate(self.scenes_cache):
+        for i, scene in enumerate(scenes):
             scene_copy = scene.copy()
             scene_copy['similarity'] = float(similarities[i])
             results.append(scene_copy)
@@ -242,12 +297,13 @@ class PublicDatasetEngine:
     
     def search_scene_to_dialogue(self, image_file):
         """Search dialogues based on scene image"""
-        if not self.dialogs_cache:
+        dialogs = self.dialogs_cache
+        if not dialogs:
             return []
         
         # Since we can't process images without CLIP, use intelligent random selection
         results = []
-        for dialog in self.dialogs_cache:
+        for dialog in dialogs:
             dialog_copy = dialog.copy()
             # Score based on dialog characteristics
             score = 0.4 + random.uniform(0, 0.5)
@@ -290,12 +346,14 @@ search_engine = PublicDatasetEngine()
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    movies, dialogs, scenes = search_engine.dataset
     return jsonify({
         'status': 'healthy',
         'data_source': 'Public datasets and APIs',
-        'movies_loaded': len(search_engine.movies_cache),
-        'dialogs_loaded': len(search_engine.dialogs_cache),
-        'scenes_loaded': len(search_engine.scenes_cache),
+        'movies_loaded': len(movies),
+        'dialogs_loaded': len(dialogs),
+        'scenes_loaded': len(scenes),
+        'dataset_load': search_engine.load_status,
         'apis_available': {
             'tmdb': search_engine.tmdb_api_key != "your_tmdb_api_key_here",
             'omdb': search_engine.omdb_api_key != "your_omdb_api_key_here"
@@ -358,13 +416,14 @@ def contextual_search():
 
 @app.route('/api/dataset', methods=['GET'])
 def get_dataset():
+    movies, dialogs, scenes = search_engine.dataset
     return jsonify({
-        'movies': search_engine.movies_cache[:10],
-        'dialogues': search_engine.dialogs_cache[:10],
-        'scenes': search_engine.scenes_cache[:10],
-        'total_movies': len(search_engine.movies_cache),
-        'total_dialogues': len(search_engine.dialogs_cache),
-        'total_scenes': len(search_engine.scenes_cache),
+        'movies': movies[:10],
+        'dialogues': dialogs[:10],
+        'scenes': scenes[:10],
+        'total_movies': len(movies),
+        'total_dialogues': len(dialogs),
+        'total_scenes': len(scenes),
         'data_sources': ['Wikipedia Movie Data', 'Famous Movie Quotes', 'Generated Scenes']
     })
 
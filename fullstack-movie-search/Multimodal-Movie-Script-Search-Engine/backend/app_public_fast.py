@@ -10,11 +10,13 @@ import random
 import re
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from compression import register_flask_compression
 from urllib.parse import quote
 import time
 
 app = Flask(__name__)
 CORS(app)
+register_flask_compression(app)
 
 class FastPublicDatasetEngine:
     def __init__(self):
@@ -7,10 +7,21 @@ import config
 from models import model_manager
 from data_manager import data_manager
 from search_engine import SearchEngine
+from metadata_index import filters_to_spec
+from request_parsing import get_filters, parse_search_request, page_response, parse_batch_queries
+from inference_executor import WorkloadPools, EndpointSaturated
+from response_cache import ResponseCache, build_response, flask_response, request_key
+from compression import register_flask_compression
 import search_engine as search_engine_module
 
 app = Flask(__name__)
 CORS(app)
+register_flask_compression(app)
+
+# Searches, summaries and generations each run on their own bounded pool so a
+# burst of slow BART/GPT-2 calls cannot hold up searches
+pools = WorkloadPools()
+response_cache = ResponseCache()
 
 def initialize_application():
     """Initialize all components of the application"""
@@ -19,18 +30,43 @@ def initialize_application():
     # Load models
     model_manager.load_models()
     
-    # Create real dataset using APIs
-    dialogues, scenes = data_manager.create_real_dataset()
-    
-    # Compute embeddings
-    data_manager.compute_embeddings(dialogues, scenes, model_manager)
+    # Create real dataset using APIs and compute embeddings
+    # (or attach to shared embeddings published by another process)
+    data_manager.load_dataset(model_manager)
     
     # Initialize search engine
     search_engine_module.search_engine = SearchEngine(model_manager, data_manager)
+    # Raw result pages must be byte-identical to serializing the record copies
+    search_engine_module.search_engine.check_raw_results()
     
     print("✓ All models and embeddings loaded successfully!")
     print("Starting Flask server...")
 
+def saturated(e):
+    """503 with Retry-After for a request rejected by a full worker pool"""
+    response = jsonify({'error': str(e)})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+def dataset_version():
+    """Current dataset identity, after picking up any newly published shared embeddings"""
+    data_manager.refresh_shared()
+    return data_manager.version
+
+def cached_json(route, data, build, cache_control=None):
+    """Response for build()'s payload, reused for identical requests on the same dataset"""
+    key = request_key(route, data, request.args.items(multi=True), dataset_version())
+    return flask_response(response_cache.get_or_build(key, build), cache_control)
+
+def paged_search(query_type, query, data):
+    """Run a paginated search, resuming from a cursor when one is given"""
+    search = parse_search_request(query_type, query, data, request.args)
+    page = pools.call(
+        'search', search_engine_module.search_engine.search_page,
+        search['query_type'], search['query'], search['filters'], search['offset'], search['limit'],
+        raw_results=True)
+    return page_response(search, page)
+
 @app.route('/api/search/dialogue-to-scene', methods=['POST'])
 def dialogue_to_scene():
     """Search for scenes based on dialogue input"""
@@ -38,17 +74,15 @@ def dialogue_to_scene():
         data = request.get_json()
         dialogue = data.get('dialogue', '')
         
-        if not dialogue:
+        if not dialogue and not data.get('cursor'):
             return jsonify({'error': 'Dialogue is required'}), 400
         
-        results = search_engine_module.search_engine.search_dialogue_to_scene(dialogue)
-        
-        return jsonify({
-            'query': dialogue,
-            'results': results,
-            'total_results': len(results)
-        })
+        return cached_json('dialogue-to-scene', data, lambda: paged_search('dialogue', dialogue, data))
     
+    except EndpointSaturated as e:
+        return saturated(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -59,17 +93,15 @@ def scene_to_dialogue():
         data = request.get_json()
         scene_description = data.get('scene_description', '')
         
-        if not scene_description:
+        if not scene_description and not data.get('cursor'):
             return jsonify({'error': 'Scene description is required'}), 400
         
-        results = search_engine_module.search_engine.search_scene_to_dialogue(scene_description)
-        
-        return jsonify({
-            'query': scene_description,
-            'results': results,
-            'total_results': len(results)
-        })
+        return cached_json('scene-to-dialogue', data, lambda: paged_search('scene', scene_description, data))
     
+    except EndpointSaturated as e:
+        return saturated(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -83,14 +115,46 @@ def contextual_search():
         if not query:
             return jsonify({'error': 'Query is required'}), 400
         
-        results = search_engine_module.search_engine.contextual_search(query)
+        filters = get_filters(data, request.args)
+        
+        def build():
+            results = pools.call('search', search_engine_module.search_engine.contextual_search, query, filters)
+            return {
+                'query': query,
+                'filters': filters_to_spec(filters),
+                'results': results,
+                'total_results': len(results)
+            }
         
-        return jsonify({
-            'query': query,
-            'results': results,
-            'total_results': len(results)
-        })
+        return cached_json('contextual', data, build)
     
+    except EndpointSaturated as e:
+        return saturated(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search/batch', methods=['POST'])
+def batch_search():
+    """Run many dialogue-to-scene / scene-to-dialogue queries in one request"""
+    try:
+        data = request.get_json()
+        parsed = parse_batch_queries(data)
+        
+        def build():
+            results = pools.call('search', search_engine_module.search_engine.search_batch, parsed, raw_results=True)
+            return {
+                'results': results,
+                'total_queries': len(results)
+            }
+        
+        return cached_json('batch', data, build)
+    
+    except EndpointSaturated as e:
+        return saturated(e)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -105,10 +169,12 @@ def summarize():
         if not text:
             return jsonify({'error': 'Text is required'}), 400
         
-        result = search_engine_module.search_engine.summarize_text(text)
+        result = pools.call('summarize', search_engine_module.search_engine.summarize_text, text)
         
         return jsonify(result)
     
+    except EndpointSaturated as e:
+        return saturated(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -123,32 +189,41 @@ def generate():
         if not prompt:
             return jsonify({'error': 'Prompt is required'}), 400
         
-        result = search_engine_module.search_engine.generate_script(prompt)
+        result = pools.call('generate', search_engine_module.search_engine.generate_script, prompt)
         
         return jsonify(result)
     
+    except EndpointSaturated as e:
+        return saturated(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
+    return flask_response(build_response({
         'status': 'healthy',
         'models_loaded': search_engine_module.search_engine is not None,
         'total_dialogues': len(data_manager.dialogues),
-        'total_scenes': len(data_manager.scenes)
-    })
+        'total_scenes': len(data_manager.scenes),
+        'embeddings_generation': data_manager.generation,
+        'workloads': pools.stats(),
+        'coalescing': search_engine_module.search_engine.in_flight.stats() if search_engine_module.search_engine else None,
+        'response_cache': response_cache.stats()
+    }), config.HEALTH_CACHE_CONTROL)
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get application statistics"""
-    return jsonify({
+    return cached_json('stats', None, lambda: {
         'total_dialogues': len(data_manager.dialogues),
         'total_scenes': len(data_manager.scenes),
         'max_results': config.MAX_RESULTS,
-        'similarity_threshold': config.SIMILARITY_THRESHOLD
-    })
+        'max_page_size': config.MAX_PAGE_SIZE,
+        'similarity_threshold': config.SIMILARITY_THRESHOLD,
+        'endpoint_concurrency': pools.limits,
+        'endpoint_queue_depth': pools.queue_depths
+    }, config.STATIC_CACHE_CONTROL)
 
 if __name__ == '__main__':
     initialize_application()
@@ -4,10 +4,12 @@ Uses mock data instead of AI models to avoid dependency issues
 """
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from compression import register_flask_compression
 import time
 
 app = Flask(__name__)
 CORS(app)
+register_flask_compression(app)
 
 # Mock dataset
 MOCK_SCENES = [
@@ -0,0 +1,157 @@
+"""
+Listing definitions and resumable checkpoints for bulk TMDB catalog crawls
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+import config
+
+class CatalogListing(NamedTuple):
+    """One paginated TMDB listing: its path, the media type of its results and how many to take"""
+    name: str
+    path: str
+    media_type: str
+    limit: int
+    params: Dict = {}
+    cache: str = 'popular'  # HTTP_CACHE_TTLS class of its pages
+
+def popular_movies(limit: int) -> CatalogListing:
+    return CatalogListing('popular_movies', '/movie/popular', 'movie', limit, {'language': 'en-US'}, 'popular')
+
+def trending_tv_shows(limit: int) -> CatalogListing:
+    return CatalogListing('trending_tv', '/trending/tv/week', 'tv', limit, {}, 'trending')
+
+def discover_movies(limit: int, year: int = None) -> CatalogListing:
+    """Movies by popularity from /discover/movie, optionally for one release year.
+
+    TMDB serves at most 500 pages of any listing, so one discover listing per
+    year is how a crawl reaches past the first 10,000 titles.
+    """
+    params = {'language': 'en-US', 'sort_by': 'popularity.desc', 'include_adult': 'false'}
+    name = 'discover_movies'
+    if year is not None:
+        params['primary_release_year'] = year
+        name = f'discover_movies_{year}'
+    return CatalogListing(name, '/discover/movie', 'movie', limit, params, 'discover')
+
+def item_key(item: Dict) -> Tuple[str, int]:
+    """Identity of a crawled title; movie and TV ids are separate namespaces"""
+    return item.get('media_type'), item.get('id')
+
+class CrawlCheckpoint:
+    """Crawl progress persisted to disk so an interrupted crawl resumes where it stopped.
+
+    Titles are appended to a JSON-lines spool and the state file (next page,
+    total pages and titles taken per listing, plus the committed spool length)
+    is replaced atomically after each append. On resume the spool is cut back
+    to the committed length, which drops a partially written batch, and its
+    titles are replayed before crawling continues from the saved pages. A
+    checkpoint for different listings, or for a crawl that completed, starts
+    over. A crawl holds an exclusive flock on the checkpoint while it runs, so
+    concurrent crawls (a reload next to a live server, workers started without
+    preload) take turns instead of overwriting each other's spool.
+    """
+
+    def __init__(self, name: str = 'catalog', directory: str = None):
+        self.directory = directory or config.CATALOG_CHECKPOINT_DIR
+        self.state_path = os.path.join(self.directory, f'{name}.json')
+        self.spool_path = os.path.join(self.directory, f'{name}.jsonl')
+        self.lock_path = os.path.join(self.directory, f'{name}.lock')
+        self.state = None
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """Hold the checkpoint's cross-process lock, waiting for another crawl to finish first"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print(f"Waiting for another crawl of {self.state_path} to finish...")
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Closing the file releases the lock
+            yield
+
+    @staticmethod
+    def fingerprint(listings: Iterable[CatalogListing]) -> str:
+        described = [[l.name, l.path, l.media_type, l.limit, sorted(l.params.items())] for l in listings]
+        return hashlib.sha256(json.dumps(described, default=str).encode('utf-8')).hexdigest()[:16]
+
+    def load(self, listings: List[CatalogListing]) -> List[Dict]:
+        """Start or resume a crawl of listings; returns the titles already crawled"""
+        fingerprint = self.fingerprint(listings)
+        state = None
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        try:
+            spooled = os.path.getsize(self.spool_path)
+        except OSError:
+            spooled = -1
+        if (state is None or state.get('fingerprint') != fingerprint or state.get('complete')
+                or spooled < state.get('spool_bytes', 0)):
+            self.state = {'fingerprint': fingerprint, 'complete': False, 'spool_bytes': 0, 'listings': {}}
+            self.reset()
+            return []
+
+        self.state = state
+        items = []
+        with open(self.spool_path, 'r+b') as f:
+            f.truncate(state['spool_bytes'])
+            for line in f:
+                items.append(json.loads(line))
+        return items
+
+    def reset(self):
+        os.makedirs(self.directory, exist_ok=True)
+        open(self.spool_path, 'wb').close()
+        self._save()
+
+    def listing(self, name: str) -> Dict:
+        """Mutable progress of one listing; persisted by the next commit()"""
+        return self.state['listings'].setdefault(name, {'next_page': 1, 'total_pages': None,
+                                                        'taken': 0, 'done': False})
+
+    def commit(self, items: List[Dict]):
+        """Durably append items to the spool, then record the listing progress that produced them"""
+        if items:
+            with open(self.spool_path, 'ab') as f:
+                f.seek(self.state['spool_bytes'])
+                f.truncate()
+                f.write(b''.join(json.dumps(item).encode('utf-8') + b'\n' for item in items))
+                f.flush()
+                os.fsync(f.fileno())
+                self.state['spool_bytes'] = f.tell()
+        self._save()
+
+    def complete(self):
+        self.state['complete'] = True
+        self._save()
+
+    def _save(self):
+        tmp_path = f"{self.state_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+def take(items: Iterable[Dict], seen: Set, listing: CatalogListing, remaining: int) -> List[Dict]:
+    """Up to `remaining` titles from one page that were not crawled before, tagged with the media type"""
+    new = []
+    for item in items:
+        if len(new) >= remaining:
+            break
+        item.setdefault('media_type', listing.media_type)
+        key = item_key(item)
+        # Rankings shift between page requests and listings overlap, so drop repeats
+        if key[1] is not None and key not in seen:
+            seen.add(key)
+            new.append(item)
+    return new
@@ -0,0 +1,137 @@
+"""
+Content negotiation and cached gzip/brotli variants of serialized response bodies
+"""
+import gzip
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+import config
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Preferred first when the client accepts several equally
+ENCODINGS = ('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Accept-Encoding header as {coding: q-value}"""
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+def negotiate_encoding(header: Optional[str]) -> Optional[str]:
+    """Best supported content coding the client accepts, or None for identity"""
+    if not config.COMPRESSION_ENABLED:
+        return None
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the body, so every worker computes the same tag"""
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    """Compress body; static bodies are compressed once, so they get the slowest, smallest settings"""
+    if encoding == 'gzip':
+        level = config.STATIC_GZIP_LEVEL if static else config.GZIP_LEVEL
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    if encoding == 'br' and BROTLI_AVAILABLE:
+        quality = config.STATIC_BROTLI_QUALITY if static else config.BROTLI_QUALITY
+        return brotli.compress(body, quality=quality)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+class CompressedBody:
+    """A serialized body plus its compressed variants, each computed at most once.
+
+    Every representation gets its own strong ETag (the identity tag with the
+    coding appended) and a Vary: Accept-Encoding header, so caches never hand a
+    compressed body to a client that did not ask for one.
+    """
+
+    def __init__(self, body: bytes, etag: str = None, static: bool = False, precompress: bool = False):
+        self.body = body
+        self.etag = etag or make_etag(body)
+        self.static = static
+        self._variants = {}
+        self._lock = threading.Lock()
+        if precompress and self.compressible:
+            for encoding in ENCODINGS:
+                self.variant(encoding)
+
+    @property
+    def compressible(self) -> bool:
+        return config.COMPRESSION_ENABLED and len(self.body) >= config.COMPRESSION_MIN_SIZE
+
+    def variant(self, encoding: str) -> bytes:
+        data = self._variants.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._variants.get(encoding)
+                if data is None:
+                    data = self._variants[encoding] = compress(self.body, encoding, self.static)
+        return data
+
+    def representation(self, accept_encoding: Optional[str]) -> Tuple[bytes, Dict[str, str]]:
+        """Body and headers (ETag, Vary, Content-Encoding) for a request's Accept-Encoding"""
+        encoding = negotiate_encoding(accept_encoding) if self.compressible else None
+        headers = {'Vary': 'Accept-Encoding'}
+        if encoding is None:
+            headers['ETag'] = self.etag
+            return self.body, headers
+        headers['ETag'] = compressed_etag(self.etag, encoding)
+        headers['Content-Encoding'] = encoding
+        return self.variant(encoding), headers
+
+def compressed_etag(etag: str, encoding: str) -> str:
+    """ETag of the compressed representation of a body with the given (strong) ETag"""
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') and not etag.startswith('W/') else etag
+
+def register_flask_compression(app):
+    """Compress a Flask app's JSON responses of at least COMPRESSION_MIN_SIZE bytes.
+
+    Responses that already carry a Content-Encoding (precompressed bodies) are
+    left untouched.
+    """
+    from flask import request
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 304)
+                or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+            return response
+        data = response.get_data()
+        if len(data) < config.COMPRESSION_MIN_SIZE:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        if 'ETag' in response.headers:
+            response.headers['ETag'] = compressed_etag(response.headers['ETag'], encoding)
+        return response
+
+    return app
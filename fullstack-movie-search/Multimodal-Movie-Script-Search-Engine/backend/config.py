@@ -16,11 +16,139 @@ GPT2_MODEL_NAME = "gpt2"
 # Search Configuration
 MAX_RESULTS = 3
 SIMILARITY_THRESHOLD = 0.0
+BATCH_MAX_QUERIES = int(os.getenv('BATCH_MAX_QUERIES', '256'))
+ENCODE_BATCH_SIZE = 64
+IMAGE_BATCH_SIZE = int(os.getenv('IMAGE_BATCH_SIZE', '32'))  # images per CLIP forward pass
+
+# Pagination Configuration
+MAX_PAGE_SIZE = 100
+RANKING_DEPTH = 1000  # candidates kept per query for deep pagination
+RANKING_CACHE_TTL = 300  # seconds
+RANKING_CACHE_SIZE = 1024
 IMAGE_SIZE = (400, 300)
 
+# Uploaded Image Configuration
+IMAGE_QUERY_SIZE = 224  # shortest side uploads are decoded/downscaled to (CLIP ViT-B/32 input)
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', str(20 * 1024 * 1024)))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', str(50_000_000)))
+IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF', 'BMP', 'TIFF', 'MPO')
+# Scene stills ingested for the image store: <scene id>.jpg, <scene id>_<frame>.jpg or <scene id>/<frame>.jpg
+SCENE_STILLS_DIR = os.getenv('SCENE_STILLS_DIR', '')
+IMAGE_DECODE_WORKERS = int(os.getenv('IMAGE_DECODE_WORKERS', str(min(8, os.cpu_count() or 1))))
+# CLIP embeddings of recent uploads, reused for perceptually identical images
+IMAGE_EMBEDDING_CACHE_SIZE = int(os.getenv('IMAGE_EMBEDDING_CACHE_SIZE', '1024'))
+IMAGE_HASH_MAX_DISTANCE = int(os.getenv('IMAGE_HASH_MAX_DISTANCE', '4'))  # of 64 perceptual-hash bits; 0 = exact
+
+# Embedding Storage Configuration
+EMBEDDING_STORAGE = os.getenv('EMBEDDING_STORAGE', 'float32')  # float32, float16 or pq
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embedding_cache'))
+EMBEDDING_SCORE_CHUNK = 65536
+PQ_SUBVECTORS = int(os.getenv('PQ_SUBVECTORS', '8'))
+PQ_CENTROIDS = 256
+PQ_TRAIN_SAMPLE = 65536
+PQ_TRAIN_ITERATIONS = 20
+PQ_RERANK_CANDIDATES = int(os.getenv('PQ_RERANK_CANDIDATES', '50'))  # 0 disables exact re-ranking
+
+# Shared Embeddings Configuration
+# When enabled, embedding arrays are published as memory-mapped files that all
+# worker processes map read-only; reload_embeddings.py publishes new generations
+SHARED_EMBEDDINGS = os.getenv('SHARED_EMBEDDINGS', 'false').lower() == 'true'
+SHARED_EMBEDDINGS_DIR = os.getenv('SHARED_EMBEDDINGS_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else EMBEDDING_CACHE_DIR)
+SHARED_EMBEDDINGS_NAME = 'movie_search_embeddings'
+
+# Vector Index Configuration
+IVF_NLIST = int(os.getenv('IVF_NLIST', '0'))  # 0 picks sqrt(number of vectors)
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '8'))
+IVF_MIN_VECTORS = 10000  # smaller corpora use a single list (exact search)
+IVF_TRAIN_SAMPLE = 65536
+IVF_TRAIN_ITERATIONS = 10
+IVF_EXACT_FILTER_ROWS = 2048  # filters matching fewer rows are scored exactly
+
 # API URLs
-TMDB_BASE_URL = "https://api.themoviedb.org/3"
-OMDB_BASE_URL = "http://www.omdbapi.com"
+TMDB_BASE_URL = os.getenv('TMDB_BASE_URL', "https://api.themoviedb.org/3")
+OMDB_BASE_URL = os.getenv('OMDB_BASE_URL', "http://www.omdbapi.com")
+WIKIPEDIA_MOVIES_URL = os.getenv('WIKIPEDIA_MOVIES_URL', "https://raw.githubusercontent.com/prust/wikipedia-movie-data/master/movies.json")
+
+# Record/replay of outbound API traffic (api_replay.py, api_standin.py)
+API_MODE = os.getenv('API_MODE', 'live')  # live, record or replay
+API_FIXTURES_DIR = os.getenv('API_FIXTURES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_fixtures'))
+
+# API Client Configuration
+API_CONNECT_TIMEOUT = 3.05  # seconds
+API_READ_TIMEOUT = 10
+API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', '20'))  # keep-alive connections per host
+API_MAX_RETRIES = 3
+API_BACKOFF_FACTOR = 0.5  # sleeps 0.5s, 1s, 2s, ... between retries unless Retry-After says otherwise
+API_RETRY_STATUSES = (429, 500, 502, 503, 504)
+API_CONCURRENCY = int(os.getenv('API_CONCURRENCY', '16'))  # parallel requests during dataset builds
+TMDB_RATE_LIMIT = float(os.getenv('TMDB_RATE_LIMIT', '40'))  # requests per second
+TMDB_RATE_BURST = 20
+OMDB_RATE_LIMIT = float(os.getenv('OMDB_RATE_LIMIT', '10'))
+OMDB_RATE_BURST = 5
+
+# HTTP Response Cache Configuration (outbound TMDB/OMDB/dataset requests)
+HTTP_CACHE_ENABLED = os.getenv('HTTP_CACHE', 'true').lower() == 'true'
+HTTP_CACHE_DIR = os.getenv('HTTP_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'http_cache'))
+HTTP_CACHE_MAX_BYTES = int(os.getenv('HTTP_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+# Seconds before an entry is revalidated, per endpoint class
+HTTP_CACHE_TTLS = {
+    'popular': 6 * 3600,
+    'trending': 6 * 3600,
+    'discover': 24 * 3600,
+    'search': 24 * 3600,
+    'movie_details': 7 * 24 * 3600,
+    'movie_images': 7 * 24 * 3600,
+    'omdb': 30 * 24 * 3600,
+    'public_dataset': 7 * 24 * 3600,
+}
+
+# Dataset Build Configuration
+DATASET_MOVIE_COUNT = int(os.getenv('DATASET_MOVIE_COUNT', '10'))  # popular movies fetched from TMDB
+DATASET_TV_COUNT = int(os.getenv('DATASET_TV_COUNT', '5'))  # trending TV shows fetched from TMDB
+DATASET_DISCOVER_COUNT = int(os.getenv('DATASET_DISCOVER_COUNT', '0'))  # extra movies from /discover/movie
+# e.g. "1980-2024": one discover listing of DATASET_DISCOVER_COUNT movies per release year
+DATASET_DISCOVER_YEARS = os.getenv('DATASET_DISCOVER_YEARS', '')
+# Crawl progress, so an interrupted dataset build resumes instead of starting over
+CATALOG_CHECKPOINT_DIR = os.getenv('CATALOG_CHECKPOINT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog_checkpoints'))
+
+# Workload Pool Configuration
+# Each endpoint class runs on its own pool of this many threads
+ENDPOINT_CONCURRENCY = {
+    'search': int(os.getenv('SEARCH_CONCURRENCY', '4')),
+    'summarize': int(os.getenv('SUMMARIZE_CONCURRENCY', '1')),
+    'generate': int(os.getenv('GENERATE_CONCURRENCY', '1')),
+}
+# Requests allowed to wait for a busy pool before new ones are rejected with 503
+ENDPOINT_QUEUE_DEPTH = {
+    'search': int(os.getenv('SEARCH_QUEUE_DEPTH', '64')),
+    'summarize': int(os.getenv('SUMMARIZE_QUEUE_DEPTH', '4')),
+    'generate': int(os.getenv('GENERATE_QUEUE_DEPTH', '4')),
+}
+SATURATED_RETRY_AFTER = 1  # seconds, sent with 503 responses
+
+# Response Cache Configuration
+# Serialized responses keyed by route, normalized request and dataset version
+RESPONSE_CACHE_TTL = 60  # seconds
+RESPONSE_CACHE_SIZE = 2048
+STATIC_CACHE_CONTROL = 'public, max-age=300'  # /api/stats, /api/dataset
+HEALTH_CACHE_CONTROL = 'no-cache'  # always revalidate; 304 while unchanged
+
+# Compression Configuration
+COMPRESSION_ENABLED = os.getenv('COMPRESS_RESPONSES', 'true').lower() == 'true'
+COMPRESSION_MIN_SIZE = 1024  # bytes; smaller bodies are sent uncompressed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # used only when the brotli package is installed
+# Static payloads (e.g. /api/dataset) are compressed once, so use maximum settings
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+DATASET_PAGE_CACHE_SIZE = 256  # paginated /api/dataset slices kept per dataset version
+
+# Pre-fork Server Configuration (serve_prefork.py)
+PREFORK_WORKERS = int(os.getenv('PREFORK_WORKERS', '0'))  # 0 uses the CPU count
+TORCH_THREADS_PER_WORKER = int(os.getenv('TORCH_THREADS_PER_WORKER', '0'))  # 0 splits cores evenly
+SERVE_MODE = os.getenv('SERVE_MODE', 'wsgi')  # wsgi (app_refactored) or asgi (app_async)
+PREFORK_THREADS = int(os.getenv('PREFORK_THREADS', '0'))  # wsgi request threads per worker; 0 covers every pool slot
+PREFORK_TIMEOUT = 120
 
 # Flask Configuration
 DEBUG = True
@@ -4,88 +4,90 @@ Data management for movie and scene datasets
 import numpy as np
 from PIL import Image
 from typing import List, Dict, Tuple
+import os
+import threading
 from api_client import api_client
+from catalog_crawl import CatalogListing, CrawlCheckpoint, discover_movies, popular_movies, trending_tv_shows
+from embedding_store import EmbeddingStore
+from image_pipeline import DedupEncoder, embed_scene_stills
+from vector_index import IVFIndex
+from metadata_index import MetadataIndex
+from shared_embeddings import SharedEmbeddingRegistry
 import config
 
+MODALITIES = ('dialogue', 'scene', 'image')
+
 class DataManager:
     def __init__(self):
         self.dialogues = []
         self.scenes = []
-        self.text_embeddings = None
-        self.image_embeddings = None
+        # Per-modality stores in the configured layout (float32, float16 or pq)
+        self.dialogue_store = None
+        self.scene_store = None
+        self.image_store = None
+        # IVF indexes over the stores and metadata bitmaps for filtering
+        self.dialogue_index = None
+        self.scene_index = None
+        self.image_index = None
+        self.dialogue_metadata = None
+        self.scene_metadata = None
+        # Record ids aligned with the matrix rows
+        self.dialogue_ids = None
+        self.scene_ids = None
+        # Replaced on every dataset swap so caches can tell generations apart
+        self.version = object()
+        self.generation = 0
+        self.shared_registry = None
+        self.lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+    
+    def load_dataset(self, model_manager):
+        """Build the dataset and embeddings, or attach to a published shared generation"""
+        if not config.SHARED_EMBEDDINGS:
+            dialogues, scenes = self.create_real_dataset()
+            self.compute_embeddings(dialogues, scenes, model_manager)
+            return
+        
+        # Workers starting together would all see generation 0; the first to take
+        # the lock builds and publishes, the rest wait for it and then attach
+        registry = SharedEmbeddingRegistry()
+        with registry.exclusive():
+            if registry.generation() == 0:
+                dialogues, scenes = self.create_real_dataset()
+                self.compute_embeddings(dialogues, scenes, model_manager)
+                self.publish_shared(registry)
+        self.attach_shared(registry)
         
+    def catalog_listings(self) -> List[CatalogListing]:
+        """TMDB listings crawled for the dataset, sized by the DATASET_* settings"""
+        listings = [popular_movies(config.DATASET_MOVIE_COUNT), trending_tv_shows(config.DATASET_TV_COUNT)]
+        if config.DATASET_DISCOVER_COUNT > 0:
+            if config.DATASET_DISCOVER_YEARS:
+                first, _, last = config.DATASET_DISCOVER_YEARS.partition('-')
+                years = range(int(first), int(last or first) + 1)
+                listings.extend(discover_movies(config.DATASET_DISCOVER_COUNT, year) for year in years)
+            else:
+                listings.append(discover_movies(config.DATASET_DISCOVER_COUNT))
+        return listings
+    
     def create_real_dataset(self) -> Tuple[List[Dict], List[Dict]]:
         """Create dataset using real movie data from APIs"""
         print("Creating real dataset from APIs...")
         
-        # Get popular movies and TV shows
-        movies = api_client.get_popular_movies(page=1)[:10]  # Get top 10 popular movies
-        tv_shows = api_client.get_trending_tv_shows(page=1)[:5]  # Get top 5 TV shows
-        
         dialogues = []
         scenes = []
         
-        # Process movies
-        for i, movie in enumerate(movies):
-            movie_details = api_client.get_movie_details(movie['id'])
-            if movie_details:
-                # Create dialogue entries
-                dialogue_samples = self._generate_dialogue_samples(movie_details)
-                for j, dialogue in enumerate(dialogue_samples):
-                    dialogues.append({
-                        "id": len(dialogues) + 1,
-                        "movie": movie_details.get('title', 'Unknown'),
-                        "dialogue": dialogue,
-                        "genre": self._format_genres(movie_details.get('genres', [])),
-                        "year": int(movie_details.get('release_date', '2000-01-01')[:4]),
-                        "language": movie_details.get('original_language', 'en').upper(),
-                        "country": self._get_country_from_language(movie_details.get('original_language', 'en')),
-                        "type": "Movie"
-                    })
-                
-                # Create scene entries
-                scenes.append({
-                    "id": len(scenes) + 1,
-                    "movie": movie_details.get('title', 'Unknown'),
-                    "description": movie_details.get('overview', 'No description available'),
-                    "image_url": f"https://image.tmdb.org/t/p/w500{movie_details.get('poster_path', '')}" if movie_details.get('poster_path') else f"https://picsum.photos/400/300?random={len(scenes) + 1}",
-                    "genre": self._format_genres(movie_details.get('genres', [])),
-                    "year": int(movie_details.get('release_date', '2000-01-01')[:4]),
-                    "language": movie_details.get('original_language', 'en').upper(),
-                    "country": self._get_country_from_language(movie_details.get('original_language', 'en')),
-                    "type": "Movie",
-                    "similarity": 0.0
-                })
-        
-        # Process TV shows
-        for tv_show in tv_shows:
-            # Create scene entries for TV shows
-            scenes.append({
-                "id": len(scenes) + 1,
-                "movie": tv_show.get('name', 'Unknown'),
-                "description": tv_show.get('overview', 'No description available'),
-                "image_url": f"https://image.tmdb.org/t/p/w500{tv_show.get('poster_path', '')}" if tv_show.get('poster_path') else f"https://picsum.photos/400/300?random={len(scenes) + 1}",
-                "genre": "Drama/Thriller",  # Default genre for TV shows
-                "year": int(tv_show.get('first_air_date', '2020-01-01')[:4]),
-                "language": tv_show.get('original_language', 'en').upper(),
-                "country": self._get_country_from_language(tv_show.get('original_language', 'en')),
-                "type": "Web Series",
-                "similarity": 0.0
-            })
-            
-            # Create dialogue entries for TV shows
-            dialogue_samples = self._generate_tv_dialogue_samples(tv_show)
-            for dialogue in dialogue_samples:
-                dialogues.append({
-                    "id": len(dialogues) + 1,
-                    "movie": tv_show.get('name', 'Unknown'),
-                    "dialogue": dialogue,
-                    "genre": "Drama/Thriller",
-                    "year": int(tv_show.get('first_air_date', '2020-01-01')[:4]),
-                    "language": tv_show.get('original_language', 'en').upper(),
-                    "country": self._get_country_from_language(tv_show.get('original_language', 'en')),
-                    "type": "Web Series"
-                })
+        # Titles stream in as listing pages arrive; movie details for each batch are
+        # fetched concurrently while the crawl checkpoint makes a failed build resumable
+        crawl = api_client.crawl_catalog(self.catalog_listings(), CrawlCheckpoint('dataset'))
+        for batch in crawl:
+            movies = [item for item in batch if item['media_type'] == 'movie']
+            for movie_details in api_client.get_movie_details_many([movie['id'] for movie in movies]):
+                if movie_details:
+                    self._add_movie(movie_details, dialogues, scenes)
+            for tv_show in batch:
+                if tv_show['media_type'] == 'tv':
+                    self._add_tv_show(tv_show, dialogues, scenes)
         
         # Add some popular Indian content manually since TMDB might not have extensive Indian content
         indian_content = self._get_indian_content()
@@ -95,6 +97,66 @@ class DataManager:
         print(f"✓ Created dataset with {len(dialogues)} dialogues and {len(scenes)} scenes")
         return dialogues, scenes
     
+    def _add_movie(self, movie_details: Dict, dialogues: List[Dict], scenes: List[Dict]):
+        """Append the dialogue and scene records of one TMDB movie"""
+        # Create dialogue entries
+        dialogue_samples = self._generate_dialogue_samples(movie_details)
+        for j, dialogue in enumerate(dialogue_samples):
+            dialogues.append({
+                "id": len(dialogues) + 1,
+                "movie": movie_details.get('title', 'Unknown'),
+                "dialogue": dialogue,
+                "genre": self._format_genres(movie_details.get('genres', [])),
+                "year": int(movie_details.get('release_date', '2000-01-01')[:4]),
+                "language": movie_details.get('original_language', 'en').upper(),
+                "country": self._get_country_from_language(movie_details.get('original_language', 'en')),
+                "type": "Movie"
+            })
+        
+        # Create scene entries
+        scenes.append({
+            "id": len(scenes) + 1,
+            "movie": movie_details.get('title', 'Unknown'),
+            "description": movie_details.get('overview', 'No description available'),
+            "image_url": f"https://image.tmdb.org/t/p/w500{movie_details.get('poster_path', '')}" if movie_details.get('poster_path') else f"https://picsum.photos/400/300?random={len(scenes) + 1}",
+            "genre": self._format_genres(movie_details.get('genres', [])),
+            "year": int(movie_details.get('release_date', '2000-01-01')[:4]),
+            "language": movie_details.get('original_language', 'en').upper(),
+            "country": self._get_country_from_language(movie_details.get('original_language', 'en')),
+            "type": "Movie",
+            "similarity": 0.0
+        })
+    
+    def _add_tv_show(self, tv_show: Dict, dialogues: List[Dict], scenes: List[Dict]):
+        """Append the scene and dialogue records of one TMDB TV show"""
+        # Create scene entries for TV shows
+        scenes.append({
+            "id": len(scenes) + 1,
+            "movie": tv_show.get('name', 'Unknown'),
+            "description": tv_show.get('overview', 'No description available'),
+            "image_url": f"https://image.tmdb.org/t/p/w500{tv_show.get('poster_path', '')}" if tv_show.get('poster_path') else f"https://picsum.photos/400/300?random={len(scenes) + 1}",
+            "genre": "Drama/Thriller",  # Default genre for TV shows
+            "year": int(tv_show.get('first_air_date', '2020-01-01')[:4]),
+            "language": tv_show.get('original_language', 'en').upper(),
+            "country": self._get_country_from_language(tv_show.get('original_language', 'en')),
+            "type": "Web Series",
+            "similarity": 0.0
+        })
+        
+        # Create dialogue entries for TV shows
+        dialogue_samples = self._generate_tv_dialogue_samples(tv_show)
+        for dialogue in dialogue_samples:
+            dialogues.append({
+                "id": len(dialogues) + 1,
+                "movie": tv_show.get('name', 'Unknown'),
+                "dialogue": dialogue,
+                "genre": "Drama/Thriller",
+                "year": int(tv_show.get('first_air_date', '2020-01-01')[:4]),
+                "language": tv_show.get('original_language', 'en').upper(),
+                "country": self._get_country_from_language(tv_show.get('original_language', 'en')),
+                "type": "Web Series"
+            })
+    
     def _generate_dialogue_samples(self, movie_details: Dict) -> List[str]:
         """Generate sample dialogues based on movie genre and overview"""
         genre = self._format_genres(movie_details.get('genres', []))
@@ -407,30 +469,139 @@ class DataManager:
         """Compute embeddings for all dialogues and scenes"""
         print("Computing embeddings...")
         
-        # Compute text embeddings
+        # Compute text embeddings, one matrix per modality
         dialogue_texts = [d['dialogue'] for d in dialogues]
         scene_texts = [s['description'] for s in scenes]
         
-        self.text_embeddings = []
-        for text in dialogue_texts + scene_texts:
-            embedding = model_manager.encode_text(text)
-            self.text_embeddings.append(embedding)
+        dialogue_store, dialogue_index = self._build_store('dialogue', [model_manager.encode_text(text) for text in dialogue_texts])
+        scene_store, scene_index = self._build_store('scene', [model_manager.encode_text(text) for text in scene_texts])
         
         print("✓ Text embeddings computed")
         
-        # Create placeholder images for scenes and compute image embeddings
-        self.image_embeddings = []
-        for scene in scenes:
-            # Create a colored image based on genre
-            color = self._get_genre_color(scene['genre'])
-            img = Image.new('RGB', config.IMAGE_SIZE, color=color)
-            embedding = model_manager.encode_image(img)
-            self.image_embeddings.append(embedding)
+        # Use scene stills where available, otherwise a placeholder coloured by genre; encoded in CLIP batches
+        stills = {}
+        if config.SCENE_STILLS_DIR:
+            stills = embed_scene_stills(config.SCENE_STILLS_DIR, [scene['id'] for scene in scenes], model_manager)
+        missing = [scene for scene in scenes if scene['id'] not in stills]
+        # Placeholders of the same colour are byte-identical, so each distinct one is encoded once
+        encoder = DedupEncoder(model_manager.encode_images)
+        placeholders = encoder.encode(
+            Image.new('RGB', config.IMAGE_SIZE, color=self._get_genre_color(scene['genre'])) for scene in missing)
+        placeholder_vectors = dict(zip((scene['id'] for scene in missing), placeholders))
+        image_embeddings = [stills.get(scene['id'], placeholder_vectors.get(scene['id'])) for scene in scenes]
+        image_store, image_index = self._build_store('image', image_embeddings)
+        
+        print(f"✓ Image embeddings computed ({encoder.encoded} distinct placeholders for {len(missing)} scenes)")
+        
+        dialogue_metadata = MetadataIndex(dialogues)
+        scene_metadata = MetadataIndex(scenes)
+        with self.lock:
+            self.dialogue_store, self.dialogue_index = dialogue_store, dialogue_index
+            self.scene_store, self.scene_index = scene_store, scene_index
+            self.image_store, self.image_index = image_store, image_index
+            self.dialogue_metadata = dialogue_metadata
+            self.scene_metadata = scene_metadata
+            self.dialogue_ids = np.array([d['id'] for d in dialogues], dtype=np.int64)
+            self.scene_ids = np.array([s['id'] for s in scenes], dtype=np.int64)
+            self.dialogues = dialogues
+            self.scenes = scenes
+            self.version = object()
+    
+    def publish_shared(self, registry: SharedEmbeddingRegistry = None) -> int:
+        """Publish the current stores, indexes and records as a new shared generation"""
+        registry = registry or SharedEmbeddingRegistry()
+        arrays = {'dialogue_ids': self.dialogue_ids, 'scene_ids': self.scene_ids}
+        store_settings = {}
+        for name in MODALITIES:
+            store_arrays, store_settings[name] = getattr(self, f"{name}_store").export_arrays()
+            arrays.update({f"{name}.store.{key}": value for key, value in store_arrays.items()})
+            index_arrays = getattr(self, f"{name}_index").export_arrays()
+            arrays.update({f"{name}.index.{key}": value for key, value in index_arrays.items()})
+        
+        metadata = {'stores': store_settings, 'dialogues': self.dialogues, 'scenes': self.scenes}
+        generation = registry.publish(arrays, metadata)
+        print(f"✓ Published shared embeddings generation {generation} to {registry.directory}")
+        return generation
+    
+    def attach_shared(self, registry: SharedEmbeddingRegistry = None):
+        """Serve from the current shared generation through read-only memory maps"""
+        registry = registry or self.shared_registry or SharedEmbeddingRegistry()
+        generation, arrays, metadata = registry.load()
+        
+        def group(prefix):
+            return {key[len(prefix):]: value for key, value in arrays.items() if key.startswith(prefix)}
         
-        print("✓ Image embeddings computed")
+        built = {}
+        for name in MODALITIES:
+            store = EmbeddingStore.from_arrays(group(f"{name}.store."), metadata['stores'][name])
+            built[name] = (store, IVFIndex.from_arrays(store, group(f"{name}.index.")))
+        dialogue_metadata = MetadataIndex(metadata['dialogues'])
+        scene_metadata = MetadataIndex(metadata['scenes'])
         
-        self.dialogues = dialogues
-        self.scenes = scenes
+        # Swap everything at once so searches never mix two generations
+        with self.lock:
+            self.dialogue_store, self.dialogue_index = built['dialogue']
+            self.scene_store, self.scene_index = built['scene']
+            self.image_store, self.image_index = built['image']
+            self.dialogue_metadata = dialogue_metadata
+            self.scene_metadata = scene_metadata
+            self.dialogue_ids = arrays['dialogue_ids']
+            self.scene_ids = arrays['scene_ids']
+            self.dialogues = metadata['dialogues']
+            self.scenes = metadata['scenes']
+            self.generation = generation
+            self.shared_registry = registry
+            self.version = object()
+        print(f"✓ Attached shared embeddings generation {generation} (pid {os.getpid()})")
+    
+    def refresh_shared(self) -> bool:
+        """Remap if a newer shared generation has been published; True when swapped"""
+        if self.shared_registry is None or self.shared_registry.generation() == self.generation:
+            return False
+        # Only one thread per process remaps; the others keep serving the old generation
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            if self.shared_registry.generation() == self.generation:
+                return False
+            self.attach_shared(self.shared_registry)
+            return True
+        finally:
+            self._refresh_lock.release()
+    
+    @property
+    def dialogue_embeddings(self) -> np.ndarray:
+        """Contiguous, L2-normalized dialogue-text matrix (None in pq mode)"""
+        return self.dialogue_store.vectors if self.dialogue_store else None
+    
+    @property
+    def scene_embeddings(self) -> np.ndarray:
+        """Contiguous, L2-normalized scene-text matrix (None in pq mode)"""
+        return self.scene_store.vectors if self.scene_store else None
+    
+    @property
+    def image_embeddings(self) -> np.ndarray:
+        """Contiguous, L2-normalized scene-image matrix (None in pq mode)"""
+        return self.image_store.vectors if self.image_store else None
+    
+    def _build_store(self, name: str, vectors: List[np.ndarray]) -> Tuple[EmbeddingStore, IVFIndex]:
+        """Normalize vectors, load them into an embedding store and index it"""
+        matrix = self._to_matrix(vectors)
+        rerank_path = os.path.join(config.EMBEDDING_CACHE_DIR, f"{name}_rerank.npy")
+        store = EmbeddingStore(rerank_path=rerank_path).build(matrix)
+        index = IVFIndex(store).build(matrix)
+        print(f"✓ {name} store: {len(store)} vectors, {store.storage}, {store.nbytes / 1024:.1f} KiB, {len(index.centroids)} IVF lists")
+        return store, index
+    
+    def _to_matrix(self, vectors: List[np.ndarray]) -> np.ndarray:
+        """Stack vectors into a contiguous float32 matrix with unit-length rows"""
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return matrix
     
     def _get_genre_color(self, genre: str) -> Tuple[int, int, int]:
         """Get color based on genre"""
@@ -0,0 +1,66 @@
+"""
+Precomputed /api/dataset listings: serialized and compressed once per dataset version
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Sequence
+from compression import CompressedBody
+from fast_json import RawJSON, dumps
+import config
+
+class DatasetPayload:
+    """JSON listing of dataset sections (e.g. "dialogues", "images") built from per-item fragments.
+
+    Each item is serialized once when the payload is created. The full
+    listing is assembled and compressed on first request (paginated callers
+    never pay for it), and paginated slices are assembled from the same
+    fragments on first request and kept in a small LRU, so serving any of
+    them is a dictionary lookup plus a bytes write.
+    """
+
+    def __init__(self, sections: Dict[str, Sequence[Dict]], extra: Dict = None,
+                 version: Hashable = None, page_cache_size: int = None):
+        self.version = version
+        self.extra = dict(extra or {})
+        self.counts = {name: len(items) for name, items in sections.items()}
+        self._items = {name: [dumps(item) for item in items] for name, items in sections.items()}
+        self.page_cache_size = page_cache_size or config.DATASET_PAGE_CACHE_SIZE
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self._full = None
+
+    @property
+    def full(self) -> CompressedBody:
+        """Every item of every section"""
+        if self._full is None:
+            with self._lock:
+                if self._full is None:
+                    self._full = self._assemble(self._items, self.extra)
+        return self._full
+
+    @staticmethod
+    def _assemble(sections: Dict[str, Sequence[bytes]], extra: Dict) -> CompressedBody:
+        payload = {name: RawJSON(b'[' + b','.join(items) + b']', len(items)) for name, items in sections.items()}
+        payload.update(extra)
+        return CompressedBody(dumps(payload), static=True, precompress=True)
+
+    def page(self, offset: int, limit: int) -> CompressedBody:
+        """Items [offset, offset + limit) of every section, with offset/limit and totals"""
+        key = (offset, limit)
+        with self._lock:
+            body = self._pages.get(key)
+            if body is not None:
+                self._pages.move_to_end(key)
+                return body
+
+        sections = {name: items[offset:offset + limit] for name, items in self._items.items()}
+        extra = {f'total_{name}': count for name, count in self.counts.items()}
+        extra.update(self.extra)
+        extra.update({'offset': offset, 'limit': limit})
+        body = self._assemble(sections, extra)
+
+        with self._lock:
+            self._pages[key] = body
+            while len(self._pages) > self.page_cache_size:
+                self._pages.popitem(last=False)
+        return body
@@ -0,0 +1,257 @@
+"""
+Embedding storage with float32, float16 and product-quantized layouts
+"""
+import os
+import numpy as np
+from typing import Dict, Optional, Tuple
+import config
+
+class EmbeddingStore:
+    """Holds one modality's unit-length vectors and scores queries against them.
+
+    Storage modes:
+      - float32: exact vectors (4 bytes per dimension)
+      - float16: half-precision vectors, scored in float32 chunks (2x smaller)
+      - pq:      product-quantized codes, one byte per subvector, scored with
+                 asymmetric distance computation (ADC) and optionally re-ranked
+                 exactly from a memory-mapped float32 copy on disk
+    """
+
+    def __init__(self, storage: str = None, pq_subvectors: int = None, pq_centroids: int = None,
+                 rerank_candidates: int = None, rerank_path: Optional[str] = None):
+        self.storage = storage or config.EMBEDDING_STORAGE
+        if self.storage not in ('float32', 'float16', 'pq'):
+            raise ValueError(f"Unknown embedding storage: {self.storage}")
+        self.pq_subvectors = pq_subvectors or config.PQ_SUBVECTORS
+        self.pq_centroids = pq_centroids or config.PQ_CENTROIDS
+        self.rerank_candidates = config.PQ_RERANK_CANDIDATES if rerank_candidates is None else rerank_candidates
+        self.rerank_path = rerank_path
+
+        self.vectors = None       # float32/float16 modes
+        self.codebooks = None     # pq mode: (subvectors, centroids, sub_dim)
+        self.codes = None         # pq mode: (n, subvectors) uint8
+        self.rerank_vectors = None
+        self.dim = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes used by the stored vectors (excluding the mmap'd re-rank copy)"""
+        if self.storage == 'pq':
+            return self.codes.nbytes + self.codebooks.nbytes if self.codes is not None else 0
+        return self.vectors.nbytes if self.vectors is not None else 0
+
+    def build(self, matrix: np.ndarray) -> 'EmbeddingStore':
+        """Load a normalized float32 matrix into the configured storage layout"""
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.count, self.dim = matrix.shape if matrix.ndim == 2 else (0, 0)
+
+        if self.storage == 'float32':
+            self.vectors = matrix
+        elif self.storage == 'float16':
+            self.vectors = matrix.astype(np.float16)
+        else:
+            self._train_pq(matrix)
+            self.codes = self._encode_pq(matrix)
+            if self.rerank_candidates > 0 and self.rerank_path:
+                self._write_rerank_copy(matrix)
+        return self
+
+    def export_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """Arrays and settings needed to rebuild this store in another process"""
+        if self.storage == 'pq':
+            arrays = {'codes': self.codes, 'codebooks': self.codebooks}
+            if self.rerank_vectors is not None:
+                arrays['rerank_vectors'] = self.rerank_vectors
+        else:
+            arrays = {'vectors': self.vectors}
+        settings = {
+            'storage': self.storage,
+            'pq_subvectors': self.pq_subvectors,
+            'rerank_candidates': self.rerank_candidates,
+            'dim': self.dim,
+            'count': self.count
+        }
+        return arrays, settings
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], settings: Dict) -> 'EmbeddingStore':
+        """Rebuild a store around existing (e.g. memory-mapped) arrays without copying"""
+        store = cls(settings['storage'], pq_subvectors=settings['pq_subvectors'],
+                    rerank_candidates=settings['rerank_candidates'])
+        store.dim, store.count = settings['dim'], settings['count']
+        if store.storage == 'pq':
+            store.codes, store.codebooks = arrays['codes'], arrays['codebooks']
+            store.rerank_vectors = arrays.get('rerank_vectors')
+        else:
+            store.vectors = arrays['vectors']
+        return store
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Score a unit-length query against all rows (or the given row subset)"""
+        query = np.asarray(query, dtype=np.float32)
+        if self.count == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        if self.storage == 'pq':
+            codes = self.codes if rows is None else self.codes[rows]
+            table = self._adc_table(query)
+            return table[np.arange(self.pq_subvectors), codes].sum(axis=1)
+
+        vectors = self.vectors if rows is None else self.vectors[rows]
+        if self.storage == 'float32':
+            return vectors @ query
+
+        # float16 has no BLAS path, so upcast in bounded chunks
+        chunk = config.EMBEDDING_SCORE_CHUNK
+        out = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), chunk):
+            out[start:start + chunk] = vectors[start:start + chunk].astype(np.float32) @ query
+        return out
+
+    def scores_batch(self, queries: np.ndarray) -> np.ndarray:
+        """Score a (queries x dim) matrix against all rows with one matrix-matrix product"""
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.storage == 'pq':
+            return np.vstack([self.scores(query) for query in queries]) if len(queries) else np.zeros((0, self.count), dtype=np.float32)
+        if self.storage == 'float32':
+            return queries @ self.vectors.T
+
+        chunk = config.EMBEDDING_SCORE_CHUNK
+        out = np.empty((len(queries), self.count), dtype=np.float32)
+        for start in range(0, self.count, chunk):
+            out[:, start:start + chunk] = queries @ self.vectors[start:start + chunk].astype(np.float32).T
+        return out
+
+    def search(self, query: np.ndarray, k: int, rows: Optional[np.ndarray] = None,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row indices, scores) of the k best rows (or of those the boolean mask allows), best first.
+
+        In pq mode the best rerank_candidates rows by ADC score are re-scored
+        exactly and re-ordered; rows past that shortlist keep their ADC order
+        and scores.
+        """
+        scores = self.scores(query, rows)
+        if mask is not None:
+            # Masking the scores keeps full scans on the matrix itself instead of a gathered copy
+            scores[~np.asarray(mask)] = -np.inf
+        candidates = top_k(scores, max(k, self.rerank_candidates) if self._can_rerank() else k)
+        if mask is not None:
+            candidates = candidates[np.isfinite(scores[candidates])]
+        positions = candidates if rows is None else np.asarray(rows)[candidates]
+        candidate_scores = scores[candidates]
+
+        if self._can_rerank():
+            # Exact re-ranking of the ADC shortlist only
+            shortlist = positions[:self.rerank_candidates]
+            exact = np.asarray(self.rerank_vectors[shortlist], dtype=np.float32) @ np.asarray(query, dtype=np.float32)
+            order = np.argsort(-exact, kind='stable')
+            positions = np.concatenate([shortlist[order], positions[len(shortlist):]])[:k]
+            candidate_scores = np.concatenate([exact[order], candidate_scores[len(shortlist):]])[:k]
+
+        return positions, candidate_scores
+
+    def reconstruct(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Decode stored rows back to float32 vectors"""
+        if self.storage != 'pq':
+            vectors = self.vectors if rows is None else self.vectors[rows]
+            return np.asarray(vectors, dtype=np.float32)
+        codes = self.codes if rows is None else self.codes[rows]
+        parts = [self.codebooks[m][codes[:, m]] for m in range(self.pq_subvectors)]
+        return np.hstack(parts).astype(np.float32)
+
+    def _can_rerank(self) -> bool:
+        return self.storage == 'pq' and self.rerank_vectors is not None and self.rerank_candidates > 0
+
+    def _train_pq(self, matrix: np.ndarray):
+        """Train one k-means codebook per subvector"""
+        if self.dim % self.pq_subvectors != 0:
+            raise ValueError(f"Embedding dimension {self.dim} is not divisible by {self.pq_subvectors} PQ subvectors")
+        sub_dim = self.dim // self.pq_subvectors
+        centroids = max(1, min(self.pq_centroids, 256, self.count))
+        rng = np.random.default_rng(0)
+
+        sample = matrix
+        if self.count > config.PQ_TRAIN_SAMPLE:
+            sample = matrix[rng.choice(self.count, config.PQ_TRAIN_SAMPLE, replace=False)]
+
+        self.codebooks = np.empty((self.pq_subvectors, centroids, sub_dim), dtype=np.float32)
+        for m in range(self.pq_subvectors):
+            sub = sample[:, m * sub_dim:(m + 1) * sub_dim]
+            self.codebooks[m] = kmeans(sub, centroids, config.PQ_TRAIN_ITERATIONS, rng)
+
+    def _encode_pq(self, matrix: np.ndarray) -> np.ndarray:
+        """Assign every subvector to its nearest centroid"""
+        sub_dim = self.dim // self.pq_subvectors
+        codes = np.empty((self.count, self.pq_subvectors), dtype=np.uint8)
+        for m in range(self.pq_subvectors):
+            sub = matrix[:, m * sub_dim:(m + 1) * sub_dim]
+            codes[:, m] = nearest_centroid(sub, self.codebooks[m])
+        return codes
+
+    def _adc_table(self, query: np.ndarray) -> np.ndarray:
+        """Inner products between each query subvector and every centroid of its codebook"""
+        sub_dim = self.dim // self.pq_subvectors
+        query_parts = query.reshape(self.pq_subvectors, 1, sub_dim)
+        return (self.codebooks * query_parts).sum(axis=2)
+
+    def _write_rerank_copy(self, matrix: np.ndarray):
+        """Persist exact vectors to disk and keep only a memory map of them"""
+        os.makedirs(os.path.dirname(self.rerank_path) or '.', exist_ok=True)
+        # Write a new file and swap it in, so existing maps of the old copy stay valid
+        tmp_path = f"{self.rerank_path}.tmp{os.getpid()}.npy"
+        np.save(tmp_path, matrix)
+        os.replace(tmp_path, self.rerank_path)
+        self.rerank_vectors = np.load(self.rerank_path, mmap_mode='r')
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return indices of the k highest scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise top-k column indices of a score matrix, best first"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((len(scores), 0), dtype=np.int64)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1)
+
+def nearest_centroid(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the closest centroid (squared L2) for every vector"""
+    distances = (
+        (vectors ** 2).sum(axis=1, keepdims=True)
+        - 2.0 * vectors @ centroids.T
+        + (centroids ** 2).sum(axis=1)
+    )
+    return distances.argmin(axis=1)
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Plain Lloyd's k-means used to train PQ codebooks"""
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = nearest_centroid(vectors, centroids)
+        for c in range(k):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                # Re-seed empty clusters from a random vector
+                centroids[c] = vectors[rng.integers(len(vectors))]
+    return centroids
+
+def recall_at_k(store: EmbeddingStore, exact: np.ndarray, queries: np.ndarray, k: int = 10) -> float:
+    """Fraction of the exact top-k neighbours that the store also returns"""
+    hits = 0
+    for query in queries:
+        expected = set(top_k(exact @ query, k).tolist())
+        found, _ = store.search(query, k)
+        hits += len(expected.intersection(found.tolist()))
+    return hits / float(len(queries) * min(k, len(exact))) if len(queries) else 0.0
@@ -0,0 +1,92 @@
+"""
+Fast JSON encoding for API responses, with numpy support and pre-serialized fragments
+"""
+import json
+import re
+import secrets
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+class RawJSON:
+    """Already-serialized JSON spliced verbatim into the output of dumps()"""
+    __slots__ = ('data', 'count')
+
+    def __init__(self, data: bytes, count: int = 0):
+        self.data = data
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+# Placeholder for RawJSON values during encoding; the random token keeps it from
+# colliding with any string a client could send
+_TOKEN = secrets.token_hex(8)
+_PLACEHOLDER = re.compile(rb'"\\u0000' + _TOKEN.encode('ascii') + rb':(\d+)\\u0000"')
+
+def dumps(payload) -> bytes:
+    """Compact UTF-8 JSON for payloads that may hold numpy values and RawJSON fragments"""
+    fragments = []
+
+    def default(value):
+        if isinstance(value, RawJSON):
+            fragments.append(value.data)
+            return f"\x00{_TOKEN}:{len(fragments) - 1}\x00"
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    if ORJSON_AVAILABLE:
+        body = orjson.dumps(payload, default=default, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        body = json.dumps(payload, default=default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if fragments:
+        body = _PLACEHOLDER.sub(lambda m: fragments[int(m.group(1))], body)
+    return body
+
+def encode_floats(values: np.ndarray) -> List[bytes]:
+    """JSON text of each value, as float(value) would serialize it"""
+    if len(values) == 0:
+        return []
+    return dumps(np.asarray(values, dtype=np.float64))[1:-1].split(b',')
+
+class RecordFragments:
+    """Per-record JSON around the "similarity" member, serialized once per dataset and reused by every response.
+
+    A result list is then built by joining the cached text before and after
+    each hit's similarity score, without copying record dicts or re-encoding
+    their fields. Records that already carry a "similarity" key (scenes do)
+    keep it in place with the new score, exactly as copying the record and
+    setting the key would; others get it appended as the last member.
+    """
+
+    _MARKER = f"\x00{_TOKEN}:similarity\x00"
+
+    def __init__(self, records: Sequence[Dict]):
+        self.records = records
+        self._parts = [None] * len(records)
+
+    def _split(self, index: int) -> Tuple[bytes, bytes]:
+        parts = self._parts[index]
+        if parts is None:
+            record = dict(self.records[index])
+            record['similarity'] = self._MARKER
+            head, tail = dumps(record).split(dumps(self._MARKER))
+            parts = self._parts[index] = (head, tail)
+        return parts
+
+    def encode(self, indices, similarities) -> RawJSON:
+        """JSON array of the records at indices, each with its "similarity" set"""
+        scores = encode_floats(similarities)
+        items = []
+        for i, score in zip(indices, scores):
+            head, tail = self._split(int(i))
+            items.append(head + score + tail)
+        return RawJSON(b'[' + b','.join(items) + b']', len(items))
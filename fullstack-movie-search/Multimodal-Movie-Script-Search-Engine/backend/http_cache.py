@@ -0,0 +1,182 @@
+"""
+Persistent on-disk cache of outbound HTTP GET responses (TMDB, OMDB, public datasets)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlencode
+import config
+
+# Never part of a cache key or stored URL
+SECRET_PARAMS = frozenset(['api_key', 'apikey'])
+# Response headers worth keeping with a cached body
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+class HTTPResponseCache:
+    """Disk-backed GET cache with per-call TTLs, conditional revalidation and size-bounded eviction.
+
+    Each entry is one file: a JSON metadata line (URL, status, validators,
+    time stored) followed by the raw body. Fresh entries are served without a
+    request; expired ones are revalidated with If-None-Match/If-Modified-Since
+    so an unchanged resource costs a 304, and if the network or upstream fails
+    the stale copy is served instead, so rebuilds also work offline. When the
+    directory grows past max_bytes the least recently used entries are deleted.
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        self.directory = directory or config.HTTP_CACHE_DIR
+        self.max_bytes = max_bytes or config.HTTP_CACHE_MAX_BYTES
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self.hits = 0
+        self.revalidated = 0
+        self.stale = 0
+        self.misses = 0
+
+    @staticmethod
+    def cache_url(url: str, params: Optional[Dict] = None) -> str:
+        """Canonical URL of a request, with parameters sorted and API keys removed"""
+        items = sorted((k, str(v)) for k, v in (params or {}).items() if k not in SECRET_PARAMS)
+        return f"{url}?{urlencode(items)}" if items else url
+
+    def _path(self, cache_url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(cache_url.encode('utf-8')).hexdigest() + '.http')
+
+    def _read(self, path: str) -> Optional[Tuple[Dict, bytes]]:
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path: str, meta: Dict, body: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        data = json.dumps(meta).encode('utf-8') + b'\n' + body
+        tmp_path = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        try:
+            previous = os.path.getsize(path)
+        except OSError:
+            previous = 0
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._account(len(data) - previous)
+
+    def _account(self, delta: int):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += delta
+            over = self._total_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def _scan_size(self) -> int:
+        try:
+            return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.http'))
+        except OSError:
+            return 0
+
+    def evict(self):
+        """Delete least recently used entries until the cache is under 90% of max_bytes"""
+        with self._lock:
+            try:
+                entries = [(e.stat().st_mtime, e.stat().st_size, e.path)
+                           for e in os.scandir(self.directory) if e.name.endswith('.http')]
+            except OSError:
+                return
+            entries.sort()
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * 0.9
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._total_bytes = total
+
+    @staticmethod
+    def _response(meta: Dict, body: bytes, cache_status: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = meta['status']
+        response._content = body
+        response.url = meta['url']
+        response.headers = CaseInsensitiveDict(meta.get('headers', {}))
+        response.headers['X-Cache'] = cache_status
+        return response
+
+    def fetch(self, url: str, params: Optional[Dict], ttl: float,
+              send: Callable[[Dict], requests.Response]) -> requests.Response:
+        """Response for GET url?params, from the cache when possible.
+
+        send(headers) performs the real request with the given extra headers
+        (conditional validators) and returns the requests.Response.
+        """
+        cache_url = self.cache_url(url, params)
+        path = self._path(cache_url)
+        cached = self._read(path)
+        now = time.time()
+
+        if cached is not None and now < cached[0]['stored_at'] + ttl:
+            try:
+                os.utime(path)  # keeps eviction least-recently-used
+            except OSError:
+                pass
+            self.hits += 1
+            return self._response(*cached, 'HIT')
+
+        headers = {}
+        if cached is not None:
+            validators = cached[0].get('headers', {})
+            if validators.get('ETag'):
+                headers['If-None-Match'] = validators['ETag']
+            if validators.get('Last-Modified'):
+                headers['If-Modified-Since'] = validators['Last-Modified']
+
+        try:
+            response = send(headers)
+        except requests.RequestException:
+            if cached is None:
+                raise
+            self.stale += 1
+            return self._response(*cached, 'STALE')
+
+        if response.status_code == 304 and cached is not None:
+            meta, body = cached
+            meta['stored_at'] = now
+            self._write(path, meta, body)
+            self.revalidated += 1
+            return self._response(meta, body, 'REVALIDATED')
+
+        if (response.status_code >= 500 or response.status_code == 429) and cached is not None:
+            self.stale += 1
+            return self._response(*cached, 'STALE')
+
+        self.misses += 1
+        if response.status_code == 200 and ttl > 0 and 'no-store' not in response.headers.get('Cache-Control', ''):
+            meta = {
+                'url': cache_url,
+                'status': response.status_code,
+                'headers': {name: response.headers[name] for name in STORED_HEADERS if name in response.headers},
+                'stored_at': now
+            }
+            self._write(path, meta, response.content)
+        return response
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'revalidated': self.revalidated, 'stale': self.stale, 'misses': self.misses}
+
+# Shared by the API clients; None when HTTP_CACHE_ENABLED is off. Record runs
+# (API_MODE=record) bypass it, since responses it answers never reach the
+# session and would be missing from the fixtures
+http_cache = HTTPResponseCache() if config.HTTP_CACHE_ENABLED and config.API_MODE != 'record' else None
@@ -0,0 +1,127 @@
+"""
+Perceptual-hash cache of CLIP embeddings for uploaded query images
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+import numpy as np
+from PIL import Image
+import config
+
+HASH_INPUT_SIZE = 32
+HASH_BITS_SIDE = 8  # 8x8 low-frequency coefficients -> 64-bit hash
+COLOUR_LEVELS = 16  # per RGB channel in the mean-colour signature
+FLAT_AC_RMS = 2.0  # grey levels of low-frequency detail below which an image counts as flat
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return (matrix * np.sqrt(2 / n)).astype(np.float32)
+
+_DCT = _dct_matrix(HASH_INPUT_SIZE)
+
+class ImageKey(NamedTuple):
+    """Cache key of an image: perceptual hash plus what the hash cannot see"""
+    colour: int  # mean RGB, COLOUR_LEVELS per channel
+    phash: int
+    flat: bool  # too little structure for the hash bits to mean anything
+
+def image_key(image: Image.Image) -> ImageKey:
+    """64-bit DCT perceptual hash of an image, with its mean colour and flatness.
+
+    The image is reduced to 32x32 and each of the 8x8 lowest frequency DCT
+    coefficients of its grayscale becomes one bit (above or below their
+    median), so re-encoding, rescaling or light edits flip only a few bits.
+    The hash ignores colour and overall brightness, which the mean-colour
+    signature adds back. Images with almost no low-frequency detail (solid
+    fills, black frames) hash to noise, so they are marked flat.
+    """
+    small = image.convert('RGB').resize((HASH_INPUT_SIZE, HASH_INPUT_SIZE), Image.BILINEAR)
+    colour = 0
+    for channel_mean in np.asarray(small, dtype=np.float32).mean(axis=(0, 1)):
+        colour = colour * COLOUR_LEVELS + min(int(channel_mean * COLOUR_LEVELS / 256), COLOUR_LEVELS - 1)
+
+    pixels = np.asarray(small.convert('L'), dtype=np.float32)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_BITS_SIDE, :HASH_BITS_SIDE].ravel()
+    # The DC term only measures overall brightness, so it does not set the threshold
+    bits = low > np.median(low[1:])
+    # The DCT is orthonormal, so this is the RMS pixel deviation the hashed coefficients carry
+    flat = np.sqrt(np.sum(low[1:] ** 2)) / HASH_INPUT_SIZE < FLAT_AC_RMS
+    return ImageKey(colour, int.from_bytes(np.packbits(bits).tobytes(), 'big'), bool(flat))
+
+def hamming_distances(hashes: np.ndarray, image_hash: int) -> np.ndarray:
+    """Bit differences between image_hash and each uint64 in hashes"""
+    xor = np.bitwise_xor(hashes, np.uint64(image_hash))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+class ImageEmbeddingCache:
+    """LRU of CLIP image embeddings keyed by perceptual hash and mean colour.
+
+    A lookup first tries the exact key, then the closest stored hash within
+    max_distance bits among entries of the same mean colour, so a screenshot
+    or poster uploaded again (re-saved, resized, recompressed) reuses its
+    embedding instead of running the vision tower. Flat images only match
+    exactly, since their hash bits are noise. max_distance=0 only reuses
+    embeddings of perceptually identical images.
+    """
+
+    def __init__(self, max_entries: int = None, max_distance: int = None):
+        self.max_entries = max_entries or config.IMAGE_EMBEDDING_CACHE_SIZE
+        self.max_distance = config.IMAGE_HASH_MAX_DISTANCE if max_distance is None else max_distance
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def get(self, key: ImageKey) -> Optional[np.ndarray]:
+        with self._lock:
+            found = key if key in self._entries else self._nearest(key)
+            if found is None:
+                self.misses += 1
+                return None
+            if found == key:
+                self.hits += 1
+            else:
+                self.near_hits += 1
+            self._entries.move_to_end(found)
+            return self._entries[found]
+
+    def _nearest(self, key: ImageKey) -> Optional[ImageKey]:
+        if self.max_distance <= 0 or key.flat:
+            return None
+        candidates = [stored for stored in self._entries if stored.colour == key.colour and not stored.flat]
+        if not candidates:
+            return None
+        distances = hamming_distances(np.array([stored.phash for stored in candidates], dtype=np.uint64), key.phash)
+        best = int(np.argmin(distances))
+        return candidates[best] if distances[best] <= self.max_distance else None
+
+    def put(self, key: ImageKey, embedding: np.ndarray):
+        embedding = np.array(embedding)
+        embedding.setflags(write=False)  # shared by every request that hits this entry
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, image: Image.Image, compute: Callable[[], np.ndarray]) -> Tuple[np.ndarray, bool]:
+        """(embedding, cache hit) for image; compute() runs only on a miss"""
+        key = image_key(image)
+        embedding = self.get(key)
+        if embedding is not None:
+            return embedding, True
+        embedding = compute()
+        self.put(key, embedding)
+        return embedding, False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'near_hits': self.near_hits,
+                    'misses': self.misses, 'max_distance': self.max_distance}
@@ -0,0 +1,114 @@
+"""
+Decoding of uploaded query images and image files: size limits, draft-mode JPEG decoding and early downscaling
+"""
+import io
+import math
+import time
+from typing import BinaryIO, Dict, NamedTuple
+from PIL import Image, ImageOps
+import config
+
+class ImageRejected(ValueError):
+    """Upload that cannot be decoded or exceeds the configured limits"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+class DecodedImage(NamedTuple):
+    image: Image.Image  # RGB, shortest side at most IMAGE_QUERY_SIZE
+    original_size: tuple
+    timings: Dict[str, float]  # read, decode and resize, in milliseconds
+
+    def server_timing(self) -> str:
+        """Timings as a Server-Timing header value"""
+        return ', '.join(f'image-{name};dur={ms}' for name, ms in self.timings.items())
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+def read_upload(stream: BinaryIO, max_bytes: int = None) -> bytes:
+    """Upload body, refusing to buffer more than max_bytes"""
+    max_bytes = max_bytes or config.IMAGE_MAX_BYTES
+    data = stream.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ImageRejected(f"Image exceeds {max_bytes // (1024 * 1024)} MB", 413)
+    if not data:
+        raise ImageRejected("Image file is empty")
+    return data
+
+def _open(fp: BinaryIO) -> Image.Image:
+    """Parse only the header and apply the format and pixel-count limits"""
+    try:
+        image = Image.open(fp)
+    except Image.DecompressionBombError:
+        raise ImageRejected("Image has too many pixels", 413)
+    except (OSError, ValueError):
+        raise ImageRejected("Unsupported or corrupt image file")
+
+    if image.format not in config.IMAGE_FORMATS:
+        raise ImageRejected(f"Unsupported image format: {image.format}")
+    width, height = image.size
+    if width * height > config.IMAGE_MAX_PIXELS:
+        raise ImageRejected(f"Image is {width}x{height}; at most {config.IMAGE_MAX_PIXELS} pixels are accepted", 413)
+    return image
+
+def _decode(image: Image.Image, target: int) -> Image.Image:
+    """Decode pixels (JPEGs in draft mode at no less than `target`), upright and RGB"""
+    width, height = image.size
+    scale = target / min(width, height)
+    if image.format == 'JPEG' and scale < 1:
+        image.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+    try:
+        image.load()
+    except (OSError, ValueError):
+        raise ImageRejected("Unsupported or corrupt image file")
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+def _downscale(image: Image.Image, target: int) -> Image.Image:
+    scale = target / min(image.size)
+    if scale < 1:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        # reducing_gap shrinks by whole factors first, which is much faster for large reductions
+        image = image.resize(size, Image.BICUBIC, reducing_gap=3.0)
+    return image
+
+def decode_image(stream: BinaryIO, target: int = None) -> DecodedImage:
+    """Decode an uploaded image straight to roughly CLIP input resolution.
+
+    Only the header is parsed before the pixel-count and format checks, so
+    oversized or unsupported uploads are refused without decoding them. JPEGs
+    are decoded in draft mode, letting libjpeg scale by 1/2, 1/4 or 1/8 while
+    decoding (still at least `target` pixels on the shortest side), and the
+    result is then resized so its shortest side is `target`. That leaves the
+    CLIP processor a small image to crop and normalize instead of a
+    full-resolution photo. EXIF orientation is applied so phone photos are
+    upright.
+    """
+    target = target or config.IMAGE_QUERY_SIZE
+    timings = {}
+
+    start = time.perf_counter()
+    data = read_upload(stream)
+    timings['read'] = _elapsed_ms(start)
+
+    start = time.perf_counter()
+    image = _open(io.BytesIO(data))
+    original_size = image.size
+    image = _decode(image, target)
+    timings['decode'] = _elapsed_ms(start)
+
+    start = time.perf_counter()
+    image = _downscale(image, target)
+    timings['resize'] = _elapsed_ms(start)
+
+    return DecodedImage(image, original_size, timings)
+
+def load_image_file(path: str, target: int = None) -> Image.Image:
+    """Image file decoded the same way as uploads (limits, draft mode, early downscale)"""
+    target = target or config.IMAGE_QUERY_SIZE
+    with open(path, 'rb') as f:
+        return _downscale(_decode(_open(f), target), target)
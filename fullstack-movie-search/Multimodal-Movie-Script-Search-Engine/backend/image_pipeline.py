@@ -0,0 +1,146 @@
+"""
+Batched ingestion of scene stills: parallel decoding feeding CLIP in fixed-size batches
+"""
+import hashlib
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Collection, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from image_ingest import ImageRejected, load_image_file
+import config
+
+STILL_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+def find_stills(directory: str) -> List[str]:
+    """Image files under directory, in a stable order"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(STILL_EXTENSIONS))
+    return paths
+
+def scene_id_of(path: str, directory: str) -> Optional[int]:
+    """Scene a still belongs to: <id>/<frame>.jpg, <id>.jpg or <id>_<frame>.jpg"""
+    parent = os.path.dirname(path)
+    if os.path.normpath(parent) != os.path.normpath(directory) and os.path.basename(parent).isdigit():
+        return int(os.path.basename(parent))
+    head = re.split(r'[_\-.]', os.path.splitext(os.path.basename(path))[0], 1)[0]
+    return int(head) if head.isdigit() else None
+
+def decoded_batches(paths: Iterable[str], batch_size: int = None,
+                    workers: int = None) -> Iterator[Tuple[List[str], List[Image.Image]]]:
+    """Decode images on a thread pool and yield them in input-order batches.
+
+    Decoding stays at most two batches ahead of the consumer, so the pool
+    keeps working while a batch is being encoded without holding the whole
+    directory in memory. Files that cannot be decoded are skipped.
+    """
+    batch_size = batch_size or config.IMAGE_BATCH_SIZE
+    paths = iter(paths)
+    pending = deque()
+    batch_paths, batch_images = [], []
+    with ThreadPoolExecutor(max_workers=workers or config.IMAGE_DECODE_WORKERS,
+                            thread_name_prefix='image-decode') as pool:
+        def fill():
+            while len(pending) < batch_size * 2:
+                path = next(paths, None)
+                if path is None:
+                    return
+                pending.append((path, pool.submit(load_image_file, path)))
+
+        fill()
+        while pending:
+            path, future = pending.popleft()
+            fill()
+            try:
+                image = future.result()
+            except (ImageRejected, OSError) as e:
+                print(f"Skipping {path}: {e}")
+                continue
+            batch_paths.append(path)
+            batch_images.append(image)
+            if len(batch_images) == batch_size:
+                yield batch_paths, batch_images
+                batch_paths, batch_images = [], []
+        if batch_images:
+            yield batch_paths, batch_images
+
+def content_key(image: Image.Image) -> bytes:
+    """Digest of an image's decoded pixels, mode and size; equal for byte-identical images"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.width}x{image.height}:".encode('ascii'))
+    digest.update(image.tobytes())
+    return digest.digest()
+
+class DedupEncoder:
+    """Runs an image encoder once per distinct pixel content.
+
+    Images are hashed as they stream in and only the first image with each
+    content key is queued for encoding (batches of IMAGE_BATCH_SIZE), so
+    duplicates are dropped right after hashing. Every image with the same
+    content gets the same read-only vector object, and vectors are remembered
+    across calls.
+    """
+
+    def __init__(self, encode_images: Callable[[List[Image.Image]], np.ndarray], batch_size: int = None):
+        self.encode_images = encode_images
+        self.batch_size = batch_size or config.IMAGE_BATCH_SIZE
+        self.vectors = {}
+        self.encoded = 0
+        self.reused = 0
+
+    def _flush(self, pending: Dict[bytes, Image.Image]):
+        if not pending:
+            return
+        for key, vector in zip(pending, self.encode_images(list(pending.values()))):
+            vector.setflags(write=False)
+            self.vectors[key] = vector
+        self.encoded += len(pending)
+        pending.clear()
+
+    def encode(self, images: Iterable[Image.Image]) -> List[np.ndarray]:
+        """One vector per input image, in order"""
+        keys, pending = [], {}
+        for image in images:
+            key = content_key(image)
+            keys.append(key)
+            if key in self.vectors or key in pending:
+                self.reused += 1
+                continue
+            pending[key] = image
+            if len(pending) >= self.batch_size:
+                self._flush(pending)
+        self._flush(pending)
+        return [self.vectors[key] for key in keys]
+
+def embed_scene_stills(directory: str, scene_ids: Collection[int], model_manager,
+                       batch_size: int = None, workers: int = None) -> Dict[int, np.ndarray]:
+    """One CLIP vector per scene from its stills in directory.
+
+    A scene's vector is the sum of its unit-length frame vectors, i.e. the
+    direction of their mean once the store normalizes it. Stills of scenes
+    not in scene_ids are never decoded.
+    """
+    wanted = set(scene_ids)
+    paths = [path for path in find_stills(directory) if scene_id_of(path, directory) in wanted]
+    sums = {}
+    frames = 0
+    # Repeated frames (black frames, title cards) are encoded once
+    encoder = DedupEncoder(model_manager.encode_images, batch_size)
+    start = time.perf_counter()
+    for batch_paths, images in decoded_batches(paths, batch_size, workers):
+        vectors = np.array(encoder.encode(images))
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        for path, vector in zip(batch_paths, vectors):
+            scene_id = scene_id_of(path, directory)
+            sums[scene_id] = sums[scene_id] + vector if scene_id in sums else vector.astype(np.float32)
+        frames += len(images)
+
+    elapsed = time.perf_counter() - start
+    print(f"✓ Embedded {frames} stills for {len(sums)} scenes in {elapsed:.1f}s "
+          f"({frames / max(elapsed, 1e-9):.1f} frames/s, {encoder.reused} duplicates reused)")
+    return sums
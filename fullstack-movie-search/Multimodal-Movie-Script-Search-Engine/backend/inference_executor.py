@@ -0,0 +1,107 @@
+"""
+Bounded per-endpoint worker pools for blocking model inference
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict
+import config
+
+class EndpointSaturated(Exception):
+    """Raised when an endpoint's pool and queue are both full"""
+
+    def __init__(self, endpoint: str, retry_after: int = None):
+        super().__init__(f"Too many pending {endpoint} requests, try again shortly")
+        self.endpoint = endpoint
+        self.retry_after = config.SATURATED_RETRY_AFTER if retry_after is None else retry_after
+
+class WorkloadPools:
+    """Dedicated thread pools per endpoint class with queue-depth limits.
+
+    Each endpoint class ("search", "summarize", "generate") gets its own pool
+    of ENDPOINT_CONCURRENCY threads plus room for ENDPOINT_QUEUE_DEPTH waiting
+    calls. Once both are full, new calls are rejected immediately with
+    EndpointSaturated instead of queueing behind seconds of BART/GPT-2 work, so
+    a burst of generation requests cannot delay searches.
+    """
+
+    def __init__(self, limits: Dict[str, int] = None, queue_depths: Dict[str, int] = None):
+        self.limits = dict(limits or config.ENDPOINT_CONCURRENCY)
+        self.queue_depths = dict(queue_depths or config.ENDPOINT_QUEUE_DEPTH)
+        self.executors = {
+            endpoint: ThreadPoolExecutor(max_workers=limit, thread_name_prefix=f"{endpoint}-pool")
+            for endpoint, limit in self.limits.items()
+        }
+        self._lock = threading.Lock()
+        self._admitted = {endpoint: 0 for endpoint in self.limits}
+        self._running = {endpoint: 0 for endpoint in self.limits}
+        self._rejected = {endpoint: 0 for endpoint in self.limits}
+
+    def _admit(self, endpoint: str):
+        if endpoint not in self.limits:
+            raise KeyError(f"No worker pool configured for endpoint: {endpoint}")
+        capacity = self.limits[endpoint] + self.queue_depths.get(endpoint, 0)
+        with self._lock:
+            if self._admitted[endpoint] >= capacity:
+                self._rejected[endpoint] += 1
+                raise EndpointSaturated(endpoint)
+            self._admitted[endpoint] += 1
+
+    def _release(self, endpoint: str, _future=None):
+        with self._lock:
+            self._admitted[endpoint] -= 1
+
+    def _tracked(self, endpoint: str, func, *args, **kwargs):
+        with self._lock:
+            self._running[endpoint] += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running[endpoint] -= 1
+
+    def submit(self, endpoint: str, func, *args, **kwargs) -> Future:
+        """Queue func(*args, **kwargs) on the endpoint's pool or raise EndpointSaturated"""
+        self._admit(endpoint)
+        try:
+            future = self.executors[endpoint].submit(self._tracked, endpoint, func, *args, **kwargs)
+        except BaseException:
+            self._release(endpoint)
+            raise
+        future.add_done_callback(functools.partial(self._release, endpoint))
+        return future
+
+    def call(self, endpoint: str, func, *args, **kwargs):
+        """Run func on the endpoint's pool and block until it returns"""
+        return self.submit(endpoint, func, *args, **kwargs).result()
+
+    def in_flight(self) -> Dict[str, int]:
+        """Number of calls currently running, per endpoint"""
+        with self._lock:
+            return dict(self._running)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Running, queued and rejected call counts plus limits, per endpoint"""
+        with self._lock:
+            return {
+                endpoint: {
+                    'running': self._running[endpoint],
+                    'queued': self._admitted[endpoint] - self._running[endpoint],
+                    'rejected': self._rejected[endpoint],
+                    'concurrency': self.limits[endpoint],
+                    'queue_depth': self.queue_depths.get(endpoint, 0)
+                }
+                for endpoint in self.limits
+            }
+
+    def shutdown(self):
+        for executor in self.executors.values():
+            executor.shutdown(wait=False)
+
+class InferenceExecutor(WorkloadPools):
+    """WorkloadPools for asyncio code: await model calls without blocking the event loop"""
+
+    async def run(self, endpoint: str, func, *args, **kwargs):
+        """Await func(*args, **kwargs) on the endpoint's pool or raise EndpointSaturated"""
+        return await asyncio.wrap_future(self.submit(endpoint, func, *args, **kwargs))
@@ -0,0 +1,194 @@
+"""
+Bitmap indexes over record metadata for pre-filtering searches
+"""
+import re
+import numpy as np
+from typing import Dict, List, Optional, Tuple, Union
+
+FILTER_FIELDS = ('genre', 'language', 'country', 'year', 'type')
+RANGE_FIELDS = ('year',)
+
+class MetadataIndex:
+    """Packed per-value bitsets for the metadata fields of a record list.
+
+    Multi-valued strings such as "Action/Crime" or "Hindi/English" are split
+    so that each part gets its own bitset. Values within a field are OR-ed and
+    fields are AND-ed, all with vectorized bitwise ops on the packed bytes.
+    Numeric range fields (year) also keep a sorted column so a range filter is
+    two binary searches plus one slice.
+    """
+
+    def __init__(self, records: List[Dict], fields=FILTER_FIELDS):
+        self.count = len(records)
+        self.fields = fields
+        self.bitsets = {}
+        for field in fields:
+            rows_by_value = {}
+            for row, record in enumerate(records):
+                for value in split_values(record.get(field)):
+                    rows_by_value.setdefault(value, []).append(row)
+            self.bitsets[field] = {value: self._pack(rows) for value, rows in rows_by_value.items()}
+        
+        self.sorted_columns = {}
+        for field in RANGE_FIELDS:
+            column = np.array([to_number(record.get(field)) for record in records], dtype=np.float64)
+            order = np.argsort(column, kind='stable')
+            # NaNs (missing values) sort last and are excluded from every range
+            valid = int(np.count_nonzero(~np.isnan(column)))
+            self.sorted_columns[field] = (column[order][:valid], order[:valid])
+
+    def _pack(self, rows: List[int]) -> np.ndarray:
+        bits = np.zeros(self.count, dtype=bool)
+        bits[rows] = True
+        return np.packbits(bits)
+
+    def _empty(self) -> np.ndarray:
+        return np.zeros((self.count + 7) // 8, dtype=np.uint8)
+
+    def field_bitset(self, field: str, values) -> np.ndarray:
+        """Packed bitset of rows whose field matches any of the values"""
+        if field not in self.bitsets:
+            raise ValueError(f"Unsupported filter field: {field}")
+        if not isinstance(values, (list, tuple, set)):
+            values = [values]
+        result = self._empty()
+        for value in values:
+            bitset = self.bitsets[field].get(normalize_value(value))
+            if bitset is not None:
+                result |= bitset
+        return result
+
+    def range_bitset(self, field: str, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        """Packed bitset of rows with low <= field <= high (either bound optional)"""
+        if field not in self.sorted_columns:
+            raise ValueError(f"Range filters are not supported on field: {field}")
+        values, order = self.sorted_columns[field]
+        start = 0 if low is None else np.searchsorted(values, low, side='left')
+        end = len(values) if high is None else np.searchsorted(values, high, side='right')
+        bits = np.zeros(self.count, dtype=bool)
+        bits[order[start:end]] = True
+        return np.packbits(bits)
+
+    def mask(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """Boolean row mask for the filters, or None when nothing is filtered"""
+        filters = parse_filters(filters)
+        if not filters:
+            return None
+        packed = None
+        for field, values in filters.items():
+            if isinstance(values, tuple):
+                bitset = self.range_bitset(field, *values)
+            else:
+                bitset = self.field_bitset(field, values)
+            packed = bitset if packed is None else packed & bitset
+        return np.unpackbits(packed, count=self.count).astype(bool)
+
+def normalize_value(value) -> str:
+    return str(value).strip().lower()
+
+def split_values(value) -> List[str]:
+    """Split a metadata value like "Action/Crime" or "Drama, Romance" into parts"""
+    if value is None:
+        return []
+    parts = re.split(r'\s*[/,]\s*', str(value))
+    return [normalize_value(part) for part in parts if part.strip()]
+
+def to_number(value) -> float:
+    """Numeric value of a metadata field, or NaN when missing/invalid"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+RANGE_PATTERN = re.compile(r'^\s*(>=|<=|>|<)\s*(-?\d+)\s*$')
+SPAN_PATTERN = re.compile(r'^\s*(\d+)\s*-\s*(\d+)\s*$')
+
+def parse_range(value) -> Optional[Tuple[Optional[float], Optional[float]]]:
+    """Parse a range filter into inclusive (low, high) bounds.
+
+    Accepts {"gte": 2015, "lt": 2020}, ">2015", "<=2000" or "2010-2015";
+    returns None for plain values that should match exactly.
+    """
+    if isinstance(value, dict):
+        low = high = None
+        for op, bound in value.items():
+            bound = to_number(bound)
+            if np.isnan(bound) or op not in ('gt', 'gte', 'lt', 'lte'):
+                raise ValueError(f"Invalid range filter: {value}")
+            if op == 'gt':
+                low = bound + 1
+            elif op == 'gte':
+                low = bound
+            elif op == 'lt':
+                high = bound - 1
+            else:
+                high = bound
+        return low, high
+    if isinstance(value, str):
+        match = RANGE_PATTERN.match(value)
+        if match:
+            op, bound = match.group(1), float(match.group(2))
+            return {'>': (bound + 1, None), '>=': (bound, None), '<': (None, bound - 1), '<=': (None, bound)}[op]
+        match = SPAN_PATTERN.match(value)
+        if match:
+            return float(match.group(1)), float(match.group(2))
+    return None
+
+def parse_filters(raw: Union[Dict, str, None]) -> Dict:
+    """Normalize a filter spec into {field: [values]} or {field: (low, high)}.
+
+    Dict form:   {"language": "Hindi", "type": ["Movie", "Web Series"], "year": {"gte": 2016}}
+    String form: "language:Hindi;type:Movie|Web Series;year>2015"
+    """
+    if not raw:
+        return {}
+    if isinstance(raw, str):
+        raw = parse_filter_string(raw)
+    if not isinstance(raw, dict):
+        raise ValueError("Filters must be an object or a filter string")
+
+    filters = {}
+    for field, value in raw.items():
+        field = field.strip().lower()
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unsupported filter field: {field}")
+        if isinstance(value, tuple) and field in RANGE_FIELDS:
+            filters[field] = value
+            continue
+        bounds = parse_range(value) if field in RANGE_FIELDS else None
+        if bounds is not None:
+            filters[field] = bounds
+        elif isinstance(value, dict):
+            raise ValueError(f"Range filters are not supported on field: {field}")
+        else:
+            filters[field] = list(value) if isinstance(value, (list, tuple, set)) else [value]
+    return filters
+
+def filters_to_spec(filters: Dict) -> Dict:
+    """JSON-safe form of parsed filters that parse_filters() maps back to the same filters"""
+    spec = {}
+    for field, values in sorted(filters.items()):
+        if isinstance(values, tuple):
+            low, high = values
+            spec[field] = {op: bound for op, bound in (('gte', low), ('lte', high)) if bound is not None}
+        else:
+            spec[field] = list(values)
+    return spec
+
+def parse_filter_string(text: str) -> Dict:
+    """Parse "field:value|value;year>2015" clauses into a filter dict"""
+    filters = {}
+    for clause in text.split(';'):
+        clause = clause.strip()
+        if not clause:
+            continue
+        match = re.match(r'^(\w+)\s*(:|>=|<=|>|<)\s*(.+)$', clause)
+        if not match:
+            raise ValueError(f"Invalid filter clause: {clause}")
+        field, op, value = match.groups()
+        if op == ':':
+            values = [v.strip() for v in value.split('|') if v.strip()]
+            filters[field] = values[0] if len(values) == 1 else values
+        else:
+            filters[field] = f"{op}{value.strip()}"
+    return filters
@@ -50,6 +50,10 @@ class ModelManager:
         """Encode text using the text model"""
         return self.text_model.encode([text])[0]
     
+    def encode_texts(self, texts):
+        """Encode a list of texts in a single batch"""
+        return self.text_model.encode(list(texts), batch_size=config.ENCODE_BATCH_SIZE)
+    
     def encode_image(self, image):
         """Encode image using CLIP model"""
         inputs = self.clip_processor(images=image, return_tensors="pt")
@@ -57,6 +61,18 @@ class ModelManager:
             image_features = self.clip_model.get_image_features(**inputs)
         return image_features.squeeze().numpy()
     
+    def encode_images(self, images):
+        """Encode a list of images with CLIP in batches of IMAGE_BATCH_SIZE; one row per image"""
+        images = list(images)
+        batches = []
+        for start in range(0, len(images), config.IMAGE_BATCH_SIZE):
+            inputs = self.clip_processor(images=images[start:start + config.IMAGE_BATCH_SIZE], return_tensors="pt")
+            with torch.no_grad():
+                batches.append(self.clip_model.get_image_features(**inputs).numpy())
+        if not batches:
+            return np.zeros((0, self.clip_model.config.projection_dim), dtype=np.float32)
+        return np.vstack(batches)
+    
     def compute_similarity(self, embedding1, embedding2):
         """Compute cosine similarity between two embeddings"""
         return np.dot(embedding1, embedding2) / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2))
@@ -0,0 +1,18 @@
+"""
+Rebuild the dataset and publish a new shared embeddings generation
+
+Running servers started with SHARED_EMBEDDINGS=true map the new generation on
+their next search request, without recomputing embeddings in each worker.
+
+Run with:  SHARED_EMBEDDINGS=true python reload_embeddings.py
+"""
+from models import model_manager
+from data_manager import data_manager
+
+if __name__ == '__main__':
+    print("Rebuilding dataset for shared embeddings...")
+    model_manager.load_models()
+    dialogues, scenes = data_manager.create_real_dataset()
+    data_manager.compute_embeddings(dialogues, scenes, model_manager)
+    generation = data_manager.publish_shared()
+    print(f"✓ Workers will switch to generation {generation} on their next request")
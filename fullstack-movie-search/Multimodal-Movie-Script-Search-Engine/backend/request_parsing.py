@@ -0,0 +1,78 @@
+"""
+Framework-independent request parsing shared by the Flask and ASGI apps
+"""
+from typing import Dict, List, Mapping, Optional
+from metadata_index import parse_filters, filters_to_spec
+from search_engine import decode_cursor
+import config
+
+def get_filters(data: Optional[Dict], args: Mapping) -> Dict:
+    """Read metadata filters from the JSON body ("filters") or query string ("filter")"""
+    raw = data.get('filters') if data else None
+    if not raw:
+        raw = args.get('filter')
+    return parse_filters(raw)
+
+def get_page_params(data: Optional[Mapping], args: Mapping, default_limit: int = None):
+    """Read offset/limit/cursor from the JSON body (or form) or query string"""
+    def param(name):
+        value = data.get(name) if data else None
+        return args.get(name) if value is None else value
+
+    def number(name, default):
+        # Only a missing (or empty query-string) value takes the default; limit 0 must reach validation
+        value = param(name)
+        return default if value is None or value == '' else int(value)
+
+    try:
+        offset = number('offset', 0)
+        limit = number('limit', default_limit or config.MAX_RESULTS)
+    except (TypeError, ValueError):
+        raise ValueError('offset and limit must be integers')
+    return offset, limit, param('cursor')
+
+def parse_search_request(query_type: str, query: str, data: Optional[Dict], args: Mapping) -> Dict:
+    """Resolve a paginated search request, resuming from a cursor when one is given"""
+    offset, limit, cursor = get_page_params(data, args)
+    if cursor:
+        page = decode_cursor(cursor)
+        query_type, query, filters = page['query_type'], page['query'], page['filters']
+        offset, limit = page['offset'], page['limit']
+    else:
+        filters = get_filters(data, args)
+    return {'query_type': query_type, 'query': query, 'filters': filters, 'offset': offset, 'limit': limit}
+
+def page_response(search: Dict, page: Dict) -> Dict:
+    """JSON body for one page of search results"""
+    return {
+        'query': search['query'],
+        'filters': filters_to_spec(search['filters']),
+        'results': page['results'],
+        'total_results': len(page['results']),
+        'total_matches': page['total_matches'],
+        'offset': page['offset'],
+        'limit': page['limit'],
+        'next_cursor': page['next_cursor']
+    }
+
+def parse_batch_queries(data: Optional[Dict]) -> List[Dict]:
+    """Validate a /api/search/batch body into [{"type", "query", "filters"}]"""
+    queries = data.get('queries', []) if data else []
+
+    if not queries or not isinstance(queries, list):
+        raise ValueError('A non-empty list of queries is required')
+    if len(queries) > config.BATCH_MAX_QUERIES:
+        raise ValueError(f'At most {config.BATCH_MAX_QUERIES} queries are allowed per batch')
+
+    parsed = []
+    for i, item in enumerate(queries):
+        if not isinstance(item, dict):
+            raise ValueError(f'Query {i} must be an object')
+        query_type = item.get('type', 'dialogue')
+        text = item.get('query') or item.get('dialogue') or item.get('scene_description') or ''
+        if query_type not in ('dialogue', 'scene'):
+            raise ValueError(f'Query {i}: type must be "dialogue" or "scene"')
+        if not text:
+            raise ValueError(f'Query {i}: query text is required')
+        parsed.append({'type': query_type, 'query': text, 'filters': parse_filters(item.get('filters'))})
+    return parsed
@@ -0,0 +1,117 @@
+"""
+Serialized HTTP response cache with ETags and conditional requests
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+from single_flight import SingleFlight
+from compression import CompressedBody
+import fast_json
+import config
+
+def serialize(payload) -> bytes:
+    """Compact UTF-8 JSON encoding used for every cached body"""
+    return fast_json.dumps(payload)
+
+def build_response(payload) -> CompressedBody:
+    """Serialized payload with its ETag; compressed variants are made on first request"""
+    return CompressedBody(serialize(payload))
+
+# Methods whose responses get Cache-Control and answer If-None-Match with 304;
+# for anything else a matching precondition would have to fail with 412 (RFC 7232 3.2)
+CONDITIONAL_METHODS = ('GET', 'HEAD')
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag (RFC 7232 3.2)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tag = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == tag:
+            return True
+    return False
+
+def flask_response(body: CompressedBody, cache_control: str = None):
+    """Serve a serialized body from a Flask view in the client's preferred encoding, or 304 when a GET already has it"""
+    from flask import current_app, request
+    data, headers = body.representation(request.headers.get('Accept-Encoding'))
+    if request.method not in CONDITIONAL_METHODS:
+        # POST searches are never HTTP-cached, so they always get the body
+        return current_app.response_class(data, mimetype='application/json', headers=headers)
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+    if etag_matches(request.headers.get('If-None-Match'), headers['ETag']):
+        return current_app.response_class(status=304, headers=headers)
+    return current_app.response_class(data, mimetype='application/json', headers=headers)
+
+def request_key(route: str, data: Optional[Dict], args: Iterable[Tuple[str, str]], version: Hashable) -> Tuple:
+    """Cache key for a request: key order and whitespace in the JSON body don't matter"""
+    body = json.dumps(data, sort_keys=True, separators=(',', ':')) if data else ''
+    return (route, body, tuple(sorted(args)), version)
+
+class ResponseCache:
+    """TTL/LRU cache of serialized responses and their compressed variants.
+
+    Callers fold the dataset version into the key, so a new dataset never
+    serves stale bodies; entries also expire after RESPONSE_CACHE_TTL seconds.
+    Concurrent misses for the same key build the response once.
+    """
+
+    def __init__(self, ttl: float = None, max_entries: int = None):
+        self.ttl = config.RESPONSE_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or config.RESPONSE_CACHE_SIZE
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._in_flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[CompressedBody]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value: CompressedBody):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, key, build: Callable[[], Dict]) -> CompressedBody:
+        """Cached response for key, or serialize and cache build()'s payload"""
+        cached = self.get(key)
+        if cached is None:
+            cached = self.fill(key, build)
+        return cached
+
+    def fill(self, key, build: Callable[[], Dict]) -> CompressedBody:
+        """Serialize and cache build()'s payload; concurrent fills of one key share a build"""
+        return self._in_flight.do(key, self._build, key, build)
+
+    def _build(self, key, build: Callable[[], Dict]) -> CompressedBody:
+        cached = build_response(build())
+        self.put(key, cached)
+        return cached
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
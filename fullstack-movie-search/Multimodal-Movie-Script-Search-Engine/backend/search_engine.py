@@ -1,70 +1,252 @@
 """
 Search engine for multimodal movie script search
 """
+import base64
+import json
+import threading
+import time
 import numpy as np
-from typing import List, Dict, Tuple
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+from metadata_index import parse_filters, filters_to_spec
+from single_flight import SingleFlight
+from fast_json import RecordFragments, RawJSON
 import config
 
+class RankingCache:
+    """Short-lived LRU of full candidate orderings, so later pages skip encoding and scoring"""
+    
+    def __init__(self, ttl: float = None, max_entries: int = None):
+        self.ttl = config.RANKING_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or config.RANKING_CACHE_SIZE
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, value = entry
+            if time.monotonic() - created > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def encode_cursor(query_type: str, query: str, filters: Dict, offset: int, limit: int) -> str:
+    """Opaque cursor carrying everything needed to fetch the next page"""
+    payload = {'t': query_type, 'q': query, 'f': filters_to_spec(filters), 'o': offset, 'l': limit}
+    raw = json.dumps(payload, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Dict:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        return {
+            'query_type': payload['t'],
+            'query': payload['q'],
+            'filters': parse_filters(payload['f']),
+            'offset': int(payload['o']),
+            'limit': int(payload['l'])
+        }
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+def check_page_bounds(offset: int, limit: int):
+    """Raise ValueError unless offset >= 0 and 1 <= limit <= MAX_PAGE_SIZE"""
+    if offset < 0 or limit < 1 or limit > config.MAX_PAGE_SIZE:
+        raise ValueError(f"offset must be >= 0 and limit between 1 and {config.MAX_PAGE_SIZE}")
+
 class SearchEngine:
     def __init__(self, model_manager, data_manager):
         self.model_manager = model_manager
         self.data_manager = data_manager
+        self.ranking_cache = RankingCache()
+        self.in_flight = SingleFlight()
+        # Pre-serialized records per dataset list, for raw JSON result pages
+        self._fragments = {}
+        self._dataset_version = data_manager.version
     
-    def search_dialogue_to_scene(self, query: str) -> List[Dict]:
-        """Search for scenes based on dialogue query"""
-        # Encode the query
-        query_embedding = self.model_manager.encode_text(query)
-        
-        # Compute similarities with all scenes
-        similarities = []
-        for i, scene in enumerate(self.data_manager.scenes):
-            scene_embedding = self.data_manager.text_embeddings[len(self.data_manager.dialogues) + i]
-            similarity = self.model_manager.compute_similarity(query_embedding, scene_embedding)
-            similarities.append((similarity, scene))
+    def search_dialogue_to_scene(self, query: str, filters: Optional[Dict] = None) -> List[Dict]:
+        """Search for scenes based on dialogue query, optionally filtered by metadata"""
+        return self.search_page('dialogue', query, filters)['results']
+    
+    def search_scene_to_dialogue(self, query: str, filters: Optional[Dict] = None) -> List[Dict]:
+        """Search for dialogues based on scene description query, optionally filtered by metadata"""
+        return self.search_page('scene', query, filters)['results']
+    
+    def search_page(self, query_type: str, query: str, filters: Optional[Dict] = None,
+                    offset: int = 0, limit: int = None, raw_results: bool = False) -> Dict:
+        """Return one page of a "dialogue" (-> scenes) or "scene" (-> dialogues) search.
         
-        # Sort by similarity and return top results
-        similarities.sort(key=lambda x: x[0], reverse=True)
+        The full candidate ordering is cached for RANKING_CACHE_TTL seconds, so
+        following pages (by offset or cursor) are slices with no re-encoding,
+        and identical requests that arrive together share one computation.
+        With raw_results the results are a pre-serialized RawJSON array for
+        fast_json.dumps instead of a list of dicts.
+        """
+        filters = parse_filters(filters)
+        limit = config.MAX_RESULTS if limit is None else limit
+        check_page_bounds(offset, limit)
         
-        # Filter by threshold and limit results
-        results = []
-        for similarity, scene in similarities[:config.MAX_RESULTS]:
-            if similarity >= config.SIMILARITY_THRESHOLD:
-                scene_copy = scene.copy()
-                scene_copy['similarity'] = float(similarity)
-                results.append(scene_copy)
+        self._check_dataset_version()
+        target = self._target(query_type)
+        records = target[2]
+        key = (id(records), query_type, query, json.dumps(filters_to_spec(filters), sort_keys=True))
+        ranking = self.ranking_cache.get(key)
+        if ranking is None:
+            # Concurrent requests for the same query share one encode + score
+            ranking = self.in_flight.do(('ranking',) + key, self._cached_ranking, key, target, query, filters)
         
-        return results
+        indices, similarities = ranking
+        end = offset + limit
+        build = self._encode_results if raw_results else self._build_results
+        results = build(indices[offset:end], similarities[offset:end], records)
+        next_cursor = encode_cursor(query_type, query, filters, end, limit) if end < len(indices) else None
+        return {
+            'results': results,
+            'offset': offset,
+            'limit': limit,
+            'total_matches': len(indices),
+            'next_cursor': next_cursor
+        }
     
-    def search_scene_to_dialogue(self, query: str) -> List[Dict]:
-        """Search for dialogues based on scene description query"""
-        # Encode the query
-        query_embedding = self.model_manager.encode_text(query)
-        
-        # Compute similarities with all dialogues
-        similarities = []
-        for i, dialogue in enumerate(self.data_manager.dialogues):
-            dialogue_embedding = self.data_manager.text_embeddings[i]
-            similarity = self.model_manager.compute_similarity(query_embedding, dialogue_embedding)
-            similarities.append((similarity, dialogue))
+    def _cached_ranking(self, key, target, query: str, filters: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        ranking = self._full_ranking(target, query, filters)
+        self.ranking_cache.put(key, ranking)
+        return ranking
+    
+    def _check_dataset_version(self):
+        """Pick up newly published shared embeddings and drop rankings of older data"""
+        self.data_manager.refresh_shared()
+        if self.data_manager.version is not self._dataset_version:
+            self.ranking_cache.clear()
+            self._fragments = {}
+            self._dataset_version = self.data_manager.version
+    
+    def _target(self, query_type: str):
+        """Consistent (index, metadata, records) snapshot searched by a query type"""
+        with self.data_manager.lock:
+            if query_type == 'dialogue':
+                return self.data_manager.scene_index, self.data_manager.scene_metadata, self.data_manager.scenes
+            if query_type == 'scene':
+                return self.data_manager.dialogue_index, self.data_manager.dialogue_metadata, self.data_manager.dialogues
+        raise ValueError(f"Unknown query type: {query_type}")
+    
+    def _full_ranking(self, target, query: str, filters: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        """Candidate rows and similarities above the threshold, best first, up to RANKING_DEPTH"""
+        index, metadata, records = target
+        if index is None or len(records) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
         
-        # Sort by similarity and return top results
-        similarities.sort(key=lambda x: x[0], reverse=True)
+        mask = metadata.mask(filters) if filters else None
+        # Rank up to RANKING_DEPTH of the probed rows; only a probe that cannot fill
+        # a page falls back to scoring every allowed row
+        indices, similarities = index.search(self._encode_query(query), config.RANKING_DEPTH, mask,
+                                             min_rows=config.MAX_PAGE_SIZE)
+        keep = similarities >= config.SIMILARITY_THRESHOLD
+        return indices[keep], similarities[keep]
+    
+    def search_batch(self, queries: List[Dict], raw_results: bool = False) -> List[Dict]:
+        """Run many dialogue/scene queries with one encoder batch and one scoring pass per modality.
+
+        Each query is {"type": "dialogue" | "scene", "query": str, "filters": optional}.
+        "dialogue" queries return scenes and "scene" queries return dialogues.
+        raw_results returns each result list as pre-serialized RawJSON.
+        """
+        build = self._encode_results if raw_results else self._build_results
+        self._check_dataset_version()
+        embeddings = self._encode_queries([q['query'] for q in queries])
         
+        responses = [None] * len(queries)
+        for query_type in ('dialogue', 'scene'):
+            index, metadata, records = self._target(query_type)
+            positions = [i for i, q in enumerate(queries) if q['type'] == query_type]
+            if not positions:
+                continue
+            if index is None or len(records) == 0:
+                hits = [([], [])] * len(positions)
+            else:
+                masks = [metadata.mask(queries[i].get('filters')) for i in positions]
+                hits = index.search_batch(embeddings[positions], config.MAX_RESULTS, masks)
+            for i, (indices, similarities) in zip(positions, hits):
+                results = build(indices, similarities, records)
+                responses[i] = {
+                    'query': queries[i]['query'],
+                    'type': query_type,
+                    'results': results,
+                    'total_results': len(results)
+                }
+        return responses
+    
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Encode a batch of text queries as unit-length float32 rows"""
+        embeddings = np.asarray(self.model_manager.encode_texts(queries), dtype=np.float32).reshape(len(queries), -1)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+    
+    def _encode_query(self, query: str) -> np.ndarray:
+        """Encode a text query as a unit-length float32 vector"""
+        query_embedding = np.asarray(self.model_manager.encode_text(query), dtype=np.float32)
+        norm = np.linalg.norm(query_embedding)
+        return query_embedding / norm if norm > 0 else query_embedding
+    
+    def _build_results(self, indices, similarities, records: List[Dict]) -> List[Dict]:
+        """Copy the ranked records, attaching similarities above the threshold"""
         # Filter by threshold and limit results
         results = []
-        for similarity, dialogue in similarities[:config.MAX_RESULTS]:
+        for idx, similarity in zip(indices, similarities):
             if similarity >= config.SIMILARITY_THRESHOLD:
-                dialogue_copy = dialogue.copy()
-                dialogue_copy['similarity'] = float(similarity)
-                results.append(dialogue_copy)
+                record_copy = records[idx].copy()
+                record_copy['similarity'] = float(similarity)
+                results.append(record_copy)
         
         return results
     
-    def contextual_search(self, query: str) -> List[Dict]:
+    def _encode_results(self, indices, similarities, records: List[Dict]) -> RawJSON:
+        """Same results as _build_results, serialized straight from the index arrays"""
+        similarities = np.asarray(similarities, dtype=np.float32)
+        keep = similarities >= config.SIMILARITY_THRESHOLD
+        fragments = self._fragments.get(id(records))
+        if fragments is None or fragments.records is not records:
+            fragments = self._fragments[id(records)] = RecordFragments(records)
+        return fragments.encode(np.asarray(indices)[keep], similarities[keep])
+    
+    def check_raw_results(self, sample: int = 64):
+        """Raise if raw (pre-serialized) results differ from serializing _build_results for the current data"""
+        for query_type in ('dialogue', 'scene'):
+            _, _, records = self._target(query_type)
+            count = min(sample, len(records))
+            if count == 0:
+                continue
+            indices = np.arange(count)
+            similarities = np.linspace(1.0, config.SIMILARITY_THRESHOLD, count, dtype=np.float32)
+            raw = self._encode_results(indices, similarities, records).data
+            expected = json.dumps(self._build_results(indices, similarities, records),
+                                  separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+            if raw != expected:
+                raise RuntimeError(f"Raw {query_type} search results do not match the serialized records")
+    
+    def contextual_search(self, query: str, filters: Optional[Dict] = None) -> List[Dict]:
         """Perform contextual search combining dialogue and scene matching"""
         # Get both dialogue and scene results
-        dialogue_results = self.search_scene_to_dialogue(query)
-        scene_results = self.search_dialogue_to_scene(query)
+        dialogue_results = self.search_scene_to_dialogue(query, filters)
+        scene_results = self.search_dialogue_to_scene(query, filters)
         
         # Create contextual results by pairing dialogues with scenes from same movie
         contextual_results = []
@@ -92,7 +274,7 @@ class SearchEngine:
     
     def summarize_text(self, text: str) -> Dict:
         """Summarize given text"""
-        summary = self.model_manager.summarize_text(text)
+        summary = self.in_flight.do(('summarize', text), self.model_manager.summarize_text, text)
         return {
             'original_text': text,
             'summary': summary,
@@ -0,0 +1,87 @@
+"""
+Pre-fork production launcher for Multimodal Movie Script Search Engine
+
+The master process loads all models and computes the embedding matrices once,
+then forks the workers. Model weights and embedding arrays are shared
+copy-on-write between workers instead of being loaded once per worker, and
+each worker's torch thread count is set so the workers together use every
+core without oversubscribing.
+
+Run with:  python serve_prefork.py
+Environment:
+  PREFORK_WORKERS           number of worker processes (default: CPU count)
+  TORCH_THREADS_PER_WORKER  intra-op threads per worker (default: cores / workers)
+  SERVE_MODE                "wsgi" (app_refactored.py) or "asgi" (app_async.py)
+  PREFORK_THREADS           request threads per wsgi worker (default: enough for
+                            every endpoint pool's workers and queue, plus a few)
+  SHARED_EMBEDDINGS         map embeddings from SHARED_EMBEDDINGS_DIR instead of
+                            holding a private copy (see reload_embeddings.py)
+"""
+import gc
+import os
+from gunicorn.app.base import BaseApplication
+import config
+
+def torch_threads_per_worker(workers: int) -> int:
+    """Split the machine's cores evenly between workers"""
+    if config.TORCH_THREADS_PER_WORKER > 0:
+        return config.TORCH_THREADS_PER_WORKER
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+def post_fork(server, worker):
+    """Runs in each worker right after fork"""
+    import torch
+    threads = torch_threads_per_worker(server.cfg.workers)
+    torch.set_num_threads(threads)
+    server.log.info(f"Worker {worker.pid}: torch using {threads} threads")
+
+def wsgi_threads() -> int:
+    """Request threads per WSGI worker.
+
+    Each request thread blocks while its endpoint pool runs the work, so there
+    must be a thread for every running and queued pool slot, plus spares for
+    /api/health and /api/stats. Otherwise slow generations occupy every thread
+    and searches wait for them instead of reaching their own pool (or its 503).
+    """
+    if config.PREFORK_THREADS > 0:
+        return config.PREFORK_THREADS
+    return sum(config.ENDPOINT_CONCURRENCY.values()) + sum(config.ENDPOINT_QUEUE_DEPTH.values()) + 4
+
+class PreforkApplication(BaseApplication):
+    """Gunicorn application that initializes everything in the master before forking"""
+
+    def __init__(self, mode: str = None, workers: int = None):
+        self.mode = mode or config.SERVE_MODE
+        self.workers = workers or config.PREFORK_WORKERS or (os.cpu_count() or 1)
+        super().__init__()
+
+    def load_config(self):
+        self.cfg.set('bind', f"{config.HOST}:{config.PORT}")
+        self.cfg.set('workers', self.workers)
+        self.cfg.set('preload_app', True)
+        self.cfg.set('post_fork', post_fork)
+        self.cfg.set('timeout', config.PREFORK_TIMEOUT)
+        if self.mode == 'asgi':
+            self.cfg.set('worker_class', 'uvicorn.workers.UvicornWorker')
+        else:
+            # The default sync worker serves one request at a time, which would
+            # queue searches behind generations before WorkloadPools sees them
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', wsgi_threads())
+
+    def load(self):
+        # With preload_app this runs once, in the master, before any fork
+        if self.mode == 'asgi':
+            from app_async import app, initialize_application
+        else:
+            from app_refactored import app, initialize_application
+        initialize_application()
+
+        # Move everything loaded so far out of the GC's tracked generations so
+        # collections in the workers don't touch (and copy) the shared pages
+        gc.collect()
+        gc.freeze()
+        return app
+
+if __name__ == '__main__':
+    PreforkApplication().run()
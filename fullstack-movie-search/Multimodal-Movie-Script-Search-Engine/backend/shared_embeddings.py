@@ -0,0 +1,119 @@
+"""
+Shared-memory publication of embedding arrays across worker processes
+"""
+import contextlib
+import fcntl
+import json
+import os
+import shutil
+import threading
+import numpy as np
+from typing import Dict, Optional, Tuple
+import config
+
+class SharedEmbeddingRegistry:
+    """Generations of named arrays stored as .npy files in a shared-memory directory.
+
+    Writers publish a complete set of arrays as a new generation directory and
+    then atomically swap a small manifest file to point at it. Readers map the
+    arrays read-only with np.load(mmap_mode='r'), so every process on the
+    machine reads the same physical pages, and poll the manifest to notice a
+    new generation without recomputing anything themselves. Publishing (and
+    any check-then-build around it) holds an exclusive flock on a lock file
+    next to the manifest, so concurrent writers never number or write the same
+    generation.
+    """
+
+    def __init__(self, name: str = None, directory: str = None):
+        self.name = name or config.SHARED_EMBEDDINGS_NAME
+        self.directory = directory or config.SHARED_EMBEDDINGS_DIR
+        self.manifest_path = os.path.join(self.directory, f"{self.name}.manifest.json")
+        self.lock_path = os.path.join(self.directory, f"{self.name}.lock")
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = None
+        self._manifest_stat = None
+        self._manifest = None
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """Hold the registry's cross-process write lock; blocks while another process holds it.
+
+        Re-entrant within one registry object, so publish() can run inside a
+        caller's exclusive() block.
+        """
+        with self._lock:
+            if self._lock_depth == 0:
+                os.makedirs(self.directory, exist_ok=True)
+                self._lock_file = open(self.lock_path, 'a')
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    # Closing the file releases the flock
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def _generation_dir(self, generation: int) -> str:
+        return os.path.join(self.directory, f"{self.name}.gen{generation}")
+
+    def _read_manifest(self) -> Optional[Dict]:
+        """Manifest contents, re-read only when the file has changed"""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if key != self._manifest_stat:
+            with open(self.manifest_path) as f:
+                self._manifest = json.load(f)
+            self._manifest_stat = key
+        return self._manifest
+
+    def generation(self) -> int:
+        """Currently published generation (0 when nothing has been published)"""
+        manifest = self._read_manifest()
+        return manifest['generation'] if manifest else 0
+
+    def publish(self, arrays: Dict[str, np.ndarray], metadata: Dict) -> int:
+        """Write a new generation and make it current; returns its number"""
+        with self.exclusive():
+            return self._publish(arrays, metadata)
+
+    def _publish(self, arrays: Dict[str, np.ndarray], metadata: Dict) -> int:
+        previous = self.generation()
+        generation = previous + 1
+        target = self._generation_dir(generation)
+        shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(target)
+
+        for key, array in arrays.items():
+            np.save(os.path.join(target, f"{key}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(target, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f)
+
+        manifest = {'generation': generation, 'path': target, 'arrays': sorted(arrays)}
+        tmp_path = f"{self.manifest_path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+        # Keep the previous generation for readers that are mid-load; older ones
+        # can go, since processes still mapping them keep the unlinked pages alive
+        for old in range(1, previous):
+            shutil.rmtree(self._generation_dir(old), ignore_errors=True)
+        return generation
+
+    def load(self) -> Tuple[int, Dict[str, np.ndarray], Dict]:
+        """Map the current generation read-only: (generation, arrays, metadata)"""
+        manifest = self._read_manifest()
+        if manifest is None:
+            raise FileNotFoundError(f"No shared embeddings published at {self.manifest_path}")
+        path = manifest['path']
+        arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode='r') for key in manifest['arrays']}
+        with open(os.path.join(path, 'metadata.json')) as f:
+            metadata = json.load(f)
+        return manifest['generation'], arrays, metadata
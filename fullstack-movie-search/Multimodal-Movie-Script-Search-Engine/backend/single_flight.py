@@ -0,0 +1,48 @@
+"""
+Single-flight coalescing of identical concurrent computations
+"""
+import threading
+from concurrent.futures import Future
+from typing import Dict, Hashable
+
+class SingleFlight:
+    """Runs at most one computation per key at a time.
+
+    The first caller for a key runs the function; callers that arrive with the
+    same key while it is still running wait for that result (or exception)
+    instead of repeating the work. Nothing is kept once the call finishes, so
+    this only removes duplicate work among requests that overlap in time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, func, *args, **kwargs):
+        """Return func(*args, **kwargs), sharing one in-flight call per key"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+    def stats(self) -> Dict[str, int]:
+        """Calls executed, calls that joined another in-flight call, and calls running now"""
+        with self._lock:
+            return {'executed': self.executed, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
@@ -0,0 +1,126 @@
+"""
+Inverted-file (IVF) vector index over an embedding store
+"""
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from embedding_store import EmbeddingStore, kmeans, nearest_centroid, top_k_rows
+import config
+
+class IVFIndex:
+    """Coarse quantizer that partitions rows into inverted lists.
+
+    A query scores only the rows of its `nprobe` closest lists. An optional
+    boolean row mask (from metadata filters) is intersected with those lists
+    before anything is scored, and highly selective masks are scored exactly.
+    """
+
+    def __init__(self, store: EmbeddingStore, nlist: int = None, nprobe: int = None):
+        self.store = store
+        self.nlist = nlist or config.IVF_NLIST
+        self.nprobe = nprobe or config.IVF_NPROBE
+        self.centroids = None
+        # Inverted lists stored CSR-style: rows of list i are list_rows[list_offsets[i]:list_offsets[i + 1]]
+        self.list_rows = None
+        self.list_offsets = None
+
+    def build(self, matrix: np.ndarray) -> 'IVFIndex':
+        """Train coarse centroids on the float32 matrix and fill the inverted lists"""
+        count = len(matrix)
+        nlist = self.nlist if self.nlist > 0 else int(np.sqrt(count))
+        nlist = max(1, min(nlist, count))
+
+        if count < config.IVF_MIN_VECTORS or nlist == 1:
+            # Too small to be worth partitioning: a single list holding every row
+            self.centroids = np.zeros((1, matrix.shape[1] if matrix.ndim == 2 else 0), dtype=np.float32)
+            assignments = np.zeros(count, dtype=np.int64)
+        else:
+            rng = np.random.default_rng(0)
+            sample = matrix
+            if count > config.IVF_TRAIN_SAMPLE:
+                sample = matrix[rng.choice(count, config.IVF_TRAIN_SAMPLE, replace=False)]
+            self.centroids = kmeans(sample, nlist, config.IVF_TRAIN_ITERATIONS, rng)
+            assignments = nearest_centroid(matrix, self.centroids)
+
+        self.list_rows = np.argsort(assignments, kind='stable').astype(np.int64)
+        self.list_offsets = np.searchsorted(assignments[self.list_rows], np.arange(len(self.centroids) + 1))
+        return self
+
+    def export_arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays needed to rebuild this index in another process"""
+        return {'centroids': self.centroids, 'list_rows': self.list_rows, 'list_offsets': self.list_offsets}
+
+    @classmethod
+    def from_arrays(cls, store: EmbeddingStore, arrays: Dict[str, np.ndarray]) -> 'IVFIndex':
+        """Rebuild an index around existing (e.g. memory-mapped) arrays without copying"""
+        index = cls(store)
+        index.centroids = arrays['centroids']
+        index.list_rows = arrays['list_rows']
+        index.list_offsets = arrays['list_offsets']
+        return index
+
+    def _allowed_rows(self, mask: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Every row the mask allows, or None to score the whole matrix (masked) in place"""
+        if mask is not None and mask.sum() <= config.IVF_EXACT_FILTER_ROWS:
+            # Selective filter: cheaper (and exact) to score every matching row
+            return np.flatnonzero(mask)
+        return None
+
+    def candidates(self, query: np.ndarray, mask: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Rows to score for a query: probed inverted lists intersected with the mask.
+
+        None when every list is probed: the whole matrix is then scored in
+        place (with the mask applied to the scores), since gathering every
+        row would copy it on each query.
+        """
+        allowed = self._allowed_rows(mask)
+        nprobe = min(self.nprobe, len(self.centroids))
+        if allowed is not None or nprobe == len(self.centroids):
+            return allowed
+
+        probe = np.argsort(-(self.centroids @ query), kind='stable')[:nprobe]
+        rows = np.concatenate([self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probe])
+        if mask is not None:
+            rows = rows[mask[rows]]
+        return rows
+
+    def search(self, query: np.ndarray, k: int, mask: Optional[np.ndarray] = None,
+               min_rows: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row indices, scores) of up to k best probed rows, best first.
+
+        Only when the probed lists hold fewer than min_rows (default k) allowed
+        rows is every allowed row scored instead; deep rankings pass a small
+        min_rows so a large k does not turn every query into a full scan.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if len(self.store) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        rows = self.candidates(query, mask)
+        if rows is not None and len(rows) < (k if min_rows is None else min_rows):
+            # Probed lists ran short; fall back to every allowed row
+            rows = self._allowed_rows(mask)
+        return self.store.search(query, k, rows, mask if rows is None else None)
+
+    def search_batch(self, queries: np.ndarray, k: int,
+                     masks: Optional[List[Optional[np.ndarray]]] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Search many queries at once; flat indexes use a single matrix-matrix product"""
+        queries = np.asarray(queries, dtype=np.float32)
+        masks = masks or [None] * len(queries)
+        if len(self.centroids) > 1 or self.store.storage == 'pq':
+            # Partitioned or re-ranked indexes already prune per query
+            return [self.search(query, k, mask) for query, mask in zip(queries, masks)]
+        if len(self.store) == 0:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+
+        scores = self.store.scores_batch(queries)
+        for i, mask in enumerate(masks):
+            if mask is not None:
+                scores[i, ~mask] = -np.inf
+        top = top_k_rows(scores, k)
+        results = []
+        for i in range(len(queries)):
+            rows = top[i]
+            row_scores = scores[i, rows]
+            keep = np.isfinite(row_scores)
+            results.append((rows[keep], row_scores[keep]))
+        return results